@@ -0,0 +1,8 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Benchmarks for the Django template coverage plugin.
+
+Run them from the root of the repo, like ``python -m benchmarks.tracer``.
+
+"""
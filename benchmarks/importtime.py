@@ -0,0 +1,70 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Measure how long it takes to import the plugin.
+
+    $ python benchmarks/importtime.py [--runs N] [--max-ms MS]
+
+Each run imports django_coverage_plugin in a fresh interpreter with
+``-X importtime``, and the median cumulative import time is reported, along
+with the slowest modules it pulled in.  With --max-ms, exits with status 1 if
+the median is over the limit, so it can be used as a regression guard.
+
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+PACKAGE = "django_coverage_plugin"
+
+
+def import_times(module):
+    """Import `module` in a new process, and parse the -X importtime report.
+
+    Returns a dict mapping module names to cumulative microseconds.
+
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=11, help="Number of imports to time.")
+    parser.add_argument("--max-ms", type=float, help="Fail if the median is more than this.")
+    parser.add_argument("--top", type=int, default=10, help="Number of slow modules to show.")
+    args = parser.parse_args(argv)
+
+    runs = [import_times(PACKAGE) for _ in range(args.runs)]
+    median_ms = statistics.median(r[PACKAGE] for r in runs) / 1000
+    print(f"import {PACKAGE}: {median_ms:.1f} ms (median of {args.runs})")
+
+    last = runs[-1]
+    template_modules = sorted(m for m in last if m.startswith("django.template"))
+    if template_modules:
+        print(f"Django template modules were imported: {', '.join(template_modules)}")
+
+    print("Slowest modules in the last run:")
+    for name, us in sorted(last.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us/1000:8.1f} ms  {name}")
+
+    if args.max_ms is not None and median_ms > args.max_ms:
+        print(f"FAIL: {median_ms:.1f} ms is more than {args.max_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
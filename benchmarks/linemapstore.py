@@ -0,0 +1,88 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Measure the shared line-map store with many worker processes.
+
+    $ python -m benchmarks.linemapstore [--workers 32] [--templates 500] [--save] [--compare]
+
+Like parallel test workers, each worker process makes the line maps for the
+same templates, once with each worker on its own, and once with a shared
+line-map store.  The workers start together.  Times are the slowest worker's
+milliseconds, and the bytes of template source read by all the workers.
+
+"""
+
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+
+from django_coverage_plugin.plugin import DjangoTemplatePlugin
+
+from . import support
+
+
+def make_templates(count, lines):
+    """Write `count` templates of `lines` lines each, returning their names."""
+    line = "<p>{{ obj.name }} {% if obj.ok %}ok{% endif %}</p>\n"
+    files = {f"templates/t{i:04d}.html": f"{{# {i} #}}\n" + line * lines for i in range(count)}
+    support.write_files(files)
+    return sorted(os.path.abspath(name) for name in files)
+
+
+def line_map_worker(filenames, options, start_at):
+    """Make the line maps for `filenames` in a new plugin, like a test worker.
+
+    Returns the seconds it took and the bytes of source read.
+
+    """
+    plugin = DjangoTemplatePlugin(options)
+    # Start with the other workers.
+    time.sleep(max(0, start_at - time.time()))
+    start = time.perf_counter()
+    for filename in filenames:
+        plugin.get_line_map(filename)
+    return time.perf_counter() - start, plugin.counters["source_bytes_read"]
+
+
+def run_workers(filenames, workers, options):
+    """Run `workers` processes at once.  Returns the slowest time and the bytes read."""
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        start_at = time.time() + 1
+        futures = [
+            executor.submit(line_map_worker, filenames, options, start_at)
+            for _ in range(workers)
+        ]
+        results = [future.result() for future in futures]
+    return max(secs for secs, _ in results), sum(read for _, read in results)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=32, help="Worker processes.")
+    parser.add_argument("--templates", type=int, default=500, help="Templates to line-map.")
+    parser.add_argument("--lines", type=int, default=200, help="Lines in each template.")
+    support.add_baseline_arguments(parser, "linemapstore.json")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with support.temp_directory():
+        filenames = make_templates(args.templates, args.lines)
+        runs = [
+            ("separate", {}),
+            ("shared-cold", {"line_map_store": os.path.abspath("maps.bin")}),
+            ("shared-warm", {"line_map_store": os.path.abspath("maps.bin")}),
+        ]
+        print(f"{args.workers} workers, {args.templates} templates of {args.lines} lines")
+        print(f"{'run':12} {'ms':>10} {'MB read':>10}")
+        for name, options in runs:
+            secs, read = run_workers(filenames, args.workers, options)
+            results[f"linemapstore/{name}"] = secs
+            print(f"{name:12} {secs*1e3:10.1f} {read/1e6:10.1f}")
+        print(f"Store: {os.path.getsize('maps.bin')/1e6:.1f} MB")
+    return support.handle_baseline_arguments(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
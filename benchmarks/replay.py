@@ -0,0 +1,76 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Replay a recorded template workload under coverage.
+
+    $ python -m benchmarks.replay workload.pkl [--cores ctrace] [--save] [--compare]
+
+Record a workload by running your tests with this in your .coveragerc::
+
+    [django_coverage_plugin]
+    record_workload = workload.pkl
+
+The workload is replayed with no coverage, with coverage but not the plugin,
+and with the plugin, so the plugin's overhead is measured on the renders your
+application really does.  If DJANGO_SETTINGS_MODULE is set, those settings
+are used, otherwise Django's defaults are.  The templates and their tag
+libraries must be importable.
+
+"""
+
+import argparse
+import sys
+
+import django
+
+from django_coverage_plugin.workload import Workload
+
+from . import support
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("workload", help="The recorded workload file.")
+    parser.add_argument(
+        "--cores", default="ctrace",
+        help="Comma-separated coverage.py cores to use. [default: %(default)s]",
+    )
+    parser.add_argument(
+        "--modes", default=",".join(support.MODES),
+        help="Comma-separated ways to run. [default: %(default)s]",
+    )
+    parser.add_argument("--number", type=int, default=3, help="Replays per timing.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timings per measurement.")
+    support.add_baseline_arguments(parser, "replay.json")
+    args = parser.parse_args(argv)
+
+    from django.conf import settings
+    if not settings.configured:
+        settings.configure()
+    django.setup()
+
+    workload = Workload.load(args.workload)
+    # Compile everything before timing.
+    workload.templates()
+    source = sorted({d for engine in workload.engine_configs for d in engine["dirs"]})
+    templates = {(engine_index, name) for engine_index, name, _ in workload.renders}
+    print(f"{len(workload.renders)} renders of {len(templates)} templates")
+
+    results = {}
+    for core in args.cores.split(","):
+        times = {}
+        for mode in args.modes.split(","):
+            times[mode], used_core = support.best_time(
+                workload.replay, mode, core, args.number, args.repeat, source=source,
+            )
+            results[f"{core}/{mode}"] = times[mode]
+            print(f"{core:8} {mode:10} {times[mode]*1000:10.1f} ms  {used_core or ''}")
+        if "plugin" in times and "coverage" in times:
+            overhead = times["plugin"] - times["coverage"]
+            results[f"{core}/overhead"] = overhead
+            print(f"{core:8} {'overhead':10} {overhead*1000:10.1f} ms")
+    return support.handle_baseline_arguments(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
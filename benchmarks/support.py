@@ -0,0 +1,210 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Shared machinery for the benchmarks."""
+
+import contextlib
+import json
+import os
+import os.path
+import platform
+import shutil
+import tempfile
+import time
+import warnings
+
+import coverage
+import django
+
+# The coverage.py cores to measure with.  Cores that can't be used here fall
+# back to another one, and the results say which core actually ran.
+CORES = ["ctrace", "pytrace", "sysmon"]
+
+# How to run the templates: with no coverage at all, with coverage but not
+# the plugin, and with the plugin.
+MODES = ["none", "coverage", "plugin"]
+
+
+def configure_django(template_dir, **more_settings):
+    """Configure Django settings for rendering templates from `template_dir`."""
+    from django.conf import settings
+
+    settings.configure(
+        TEMPLATES=[
+            {
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'DIRS': [template_dir],
+                'OPTIONS': {
+                    'debug': True,
+                    'loaders': [
+                        'django.template.loaders.filesystem.Loader',
+                    ],
+                },
+            },
+        ],
+        **more_settings
+    )
+    django.setup()
+
+
+@contextlib.contextmanager
+def temp_directory():
+    """Make a temporary directory, and make it the current directory."""
+    old_dir = os.getcwd()
+    temp_dir = tempfile.mkdtemp(prefix="dcp_bench_")
+    os.chdir(temp_dir)
+    try:
+        yield temp_dir
+    finally:
+        os.chdir(old_dir)
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def write_files(files, root="."):
+    """Write `files`, a dict mapping relative file names to their text."""
+    for name, text in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+
+
+@contextlib.contextmanager
+def measuring(mode, core, plugin_options=None, source=(".",)):
+    """Run the body of the `with` under coverage, as `mode` and `core` say.
+
+    `plugin_options` are settings for the plugin's section of the
+    configuration, and `source` is the directories to measure.  Yields the
+    name of the tracer coverage.py actually used, noting if it couldn't use
+    plugins, or None if `mode` is "none".
+
+    """
+    if mode == "none":
+        yield None
+        return
+
+    old_core = os.environ.get("COVERAGE_CORE")
+    os.environ["COVERAGE_CORE"] = core
+    try:
+        cov = coverage.Coverage(data_file=None, source=list(source), config_file=False)
+        if mode == "plugin":
+            cov.config.set_option("run:plugins", ["django_coverage_plugin"])
+            for name, value in (plugin_options or {}).items():
+                cov.config.set_option(f"django_coverage_plugin:{name}", value)
+        with warnings.catch_warnings(record=True) as caught:
+            # Some cores can't be used in some situations, or can't use
+            # plugins.  We report what was used instead of warning.
+            warnings.simplefilter("always")
+            cov.start()
+        used = dict(cov.sys_info()).get("core", core)
+        if any("aren't supported" in str(w.message) for w in caught):
+            used += " without plugins"
+        try:
+            yield used
+        finally:
+            cov.stop()
+    finally:
+        if old_core is None:
+            del os.environ["COVERAGE_CORE"]
+        else:
+            os.environ["COVERAGE_CORE"] = old_core
+
+
+def best_time(func, mode, core, number=10, repeat=5, **measure_kwargs):
+    """Time `func` under coverage.
+
+    Runs `repeat` rounds of `number` calls, each round measured as `mode` and
+    `core` say, and with `measure_kwargs` passed to `measuring`.  Returns the
+    best time per call in seconds, and the name of the tracer actually used.
+
+    """
+    best = None
+    used_core = None
+    for _ in range(repeat):
+        with measuring(mode, core, **measure_kwargs) as used_core:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            elapsed = (time.perf_counter() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, used_core
+
+
+def save_results(filename, results):
+    """Save `results`, a dict of names to seconds, as a baseline."""
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    data = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "django": django.get_version(),
+            "coverage": coverage.__version__,
+        },
+        "results": results,
+    }
+    with open(filename, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+def compare_results(filename, results, threshold=0.10):
+    """Compare `results` to the baseline saved in `filename`.
+
+    Prints a line for each result in both, and returns the names of the
+    results more than `threshold` slower than the baseline.
+
+    """
+    with open(filename) as f:
+        baseline = json.load(f)
+    print(f"Compared to {filename} ({baseline['meta']}):")
+    slower = []
+    for name in sorted(results):
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]
+        now = results[name]
+        if before <= 0:
+            # Overheads can be measured as negative, there's no useful ratio.
+            print(f"  {name:50} {before*1e6:12.1f} -> {now*1e6:12.1f} us")
+            continue
+        ratio = now / before
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            slower.append(name)
+        print(f"  {name:50} {before*1e6:12.1f} -> {now*1e6:12.1f} us  {ratio:6.2f}x{flag}")
+    return slower
+
+
+def add_baseline_arguments(parser, default_file):
+    """Add the --save, --compare and --threshold options to `parser`.
+
+    Baselines are stored in the .benchmarks directory unless a file is named.
+    File names are made absolute, since benchmarks run in temp directories.
+
+    """
+    default_file = os.path.abspath(os.path.join(".benchmarks", default_file))
+    parser.add_argument(
+        "--save", nargs="?", const=default_file, metavar="FILE", type=os.path.abspath,
+        help=f"Save the results as a baseline. [default file: {default_file}]",
+    )
+    parser.add_argument(
+        "--compare", nargs="?", const=default_file, metavar="FILE", type=os.path.abspath,
+        help="Compare the results to a saved baseline, exit 1 if any are slower.",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.10,
+        help="How much slower is a regression. [default: %(default)s]",
+    )
+
+
+def handle_baseline_arguments(args, results):
+    """Save or compare `results` as the arguments say.  Returns an exit status."""
+    status = 0
+    if args.compare:
+        if compare_results(args.compare, results, args.threshold):
+            status = 1
+    if args.save:
+        save_results(args.save, results)
+        print(f"Saved results to {args.save}")
+    return status
@@ -0,0 +1,142 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Measure the plugin's tracing overhead for each kind of template node.
+
+    $ python -m benchmarks.tracer [--cores ctrace,pytrace] [--save] [--compare]
+
+Each kind of node gets a template that is mostly that kind of node.  The
+template is rendered with no coverage, with coverage but not the plugin, and
+with the plugin, under each coverage.py core.  The overhead is the extra time
+the plugin adds to coverage.  Times are microseconds per render.
+
+Not every core can use plugins in every version of coverage.py.  The tracer
+column shows what was really used.
+
+"""
+
+import argparse
+import sys
+
+from . import support
+
+# Templates that exercise one kind of node each.  Each entry is the files to
+# write, and the context to render "main.html" with.
+NODE_TEMPLATES = {
+    "text": (
+        {"main.html": "Just some text on a line.\n" * 200},
+        {},
+    ),
+    "variable": (
+        {"main.html": "{{ name }} has {{ obj.count }} items.\n" * 100},
+        {"name": "Ned", "obj": {"count": 17}},
+    ),
+    "for": (
+        {"main.html": "{% for i in items %}{% for j in items %}x{% endfor %}{% endfor %}\n"},
+        {"items": list(range(20))},
+    ),
+    "if": (
+        {"main.html": (
+            "{% for i in items %}"
+            "{% if i == 1 %}one{% elif i == 2 %}two{% else %}many{% endif %}"
+            "{% endfor %}\n"
+        )},
+        {"items": list(range(200))},
+    ),
+    "include": (
+        {
+            "main.html": "{% for i in items %}{% include './part.html' %}{% endfor %}\n",
+            "part.html": "Part {{ i }}\n",
+        },
+        {"items": list(range(50))},
+    ),
+    "extends": (
+        {
+            "main.html": "{% extends './middle.html' %}\n" + "".join(
+                f"{{% block b{i} %}}Main {i}{{% endblock %}}\n" for i in range(20)
+            ),
+            "middle.html": "{% extends './base.html' %}\n" + "".join(
+                f"{{% block b{i} %}}Middle {i}{{{{ block.super }}}}{{% endblock %}}\n"
+                for i in range(20)
+            ),
+            "base.html": "".join(
+                f"{{% block b{i} %}}Base {i}{{% endblock %}}\n" for i in range(20)
+            ),
+        },
+        {},
+    ),
+    "verbatim": (
+        {"main.html": "{% verbatim %}{{ not a variable }}{% endverbatim %}\n" * 100},
+        {},
+    ),
+    "blocktrans": (
+        {"main.html": "{% load i18n %}\n" + (
+            "{% blocktrans count counter=items|length %}One {{ counter }}"
+            "{% plural %}Many {{ counter }}{% endblocktrans %}\n"
+        ) * 50},
+        {"items": [1, 2, 3]},
+    ),
+}
+
+
+def run(node_types, cores, number, repeat):
+    """Run the benchmarks, returning a dict of result names to seconds."""
+    from django.template import engines
+
+    results = {}
+    for core in cores:
+        print(f"--- core {core}")
+        print(
+            f"{'node':12} {'none':>10} {'coverage':>10} {'plugin':>10} {'overhead':>10}"
+            "     tracer"
+        )
+        for node_type in node_types:
+            files, context = NODE_TEMPLATES[node_type]
+            support.write_files(files, root=f"templates/{node_type}")
+            template = engines["django"].get_template(f"{node_type}/main.html")
+
+            def render():
+                template.render(context)
+
+            times = {}
+            for mode in support.MODES:
+                times[mode], used_core = support.best_time(render, mode, core, number, repeat)
+                results[f"{core}/{node_type}/{mode}"] = times[mode]
+            overhead = times["plugin"] - times["coverage"]
+            results[f"{core}/{node_type}/overhead"] = overhead
+            print(
+                f"{node_type:12} " +
+                " ".join(f"{times[mode]*1e6:10.1f}" for mode in support.MODES) +
+                f" {overhead*1e6:10.1f} us  {used_core}"
+            )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--cores", default=",".join(support.CORES),
+        help="Comma-separated coverage.py cores to use. [default: %(default)s]",
+    )
+    parser.add_argument(
+        "--nodes", default=",".join(NODE_TEMPLATES),
+        help="Comma-separated kinds of node to measure. [default: all of them]",
+    )
+    parser.add_argument("--number", type=int, default=10, help="Renders per timing.")
+    parser.add_argument("--repeat", type=int, default=5, help="Timings per measurement.")
+    support.add_baseline_arguments(parser, "tracer.json")
+    args = parser.parse_args(argv)
+
+    with support.temp_directory():
+        support.configure_django("templates")
+        results = run(
+            node_types=args.nodes.split(","),
+            cores=args.cores.split(","),
+            number=args.number,
+            repeat=args.repeat,
+        )
+    return support.handle_baseline_arguments(args, results)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Command-line tools for the Django template coverage plugin.
+
+    $ python -m django_coverage_plugin analyze templates/ -o template_lines.json
+    $ python -m django_coverage_plugin timings plugin_timings.json
+    $ python -m django_coverage_plugin tracelog plugin_trace.log
+    $ python -m django_coverage_plugin hits plugin_hits.json --html hits_html
+    $ python -m django_coverage_plugin render-times plugin_render_times.json
+    $ python -m django_coverage_plugin queries plugin_queries.json
+    $ python -m django_coverage_plugin loops plugin_loops.json
+    $ python -m django_coverage_plugin cache plugin_cache.json
+    $ python -m django_coverage_plugin allocations plugin_allocations.json
+    $ python -m django_coverage_plugin loads plugin_loads.json
+    $ python -m django_coverage_plugin expressions plugin_expressions.json
+    $ python -m django_coverage_plugin stacks plugin_stacks.txt > stacks.folded
+
+"""
+
+import argparse
+import collections
+import json
+import sys
+
+
+def analyze(args):
+    """Write a line index for all the templates in `args.dirs`."""
+    from .index import build_index
+    from .plugin import DjangoTemplatePlugin
+
+    plugin = DjangoTemplatePlugin({"template_extensions": args.extensions})
+    filenames = []
+    for src_dir in args.dirs:
+        filenames.extend(plugin.find_executable_files(src_dir))
+
+    index, errors = build_index(filenames, jobs=args.jobs)
+    for filename, message in errors:
+        print(f"Couldn't analyze {filename}: {message}", file=sys.stderr)
+    index.write(args.output)
+    print(f"Wrote {len(filenames) - len(errors)} templates to {args.output}")
+    return 1 if errors else 0
+
+
+def timings(args):
+    """Combine the per-process timing files for `args.file`, and summarize."""
+    from .timing import Timings
+
+    combined = Timings.combine(args.file, keep=args.keep)
+    for line in combined.summary():
+        print(line)
+    print()
+    for line in combined.template_summary(args.top, args.sort):
+        print(line)
+    if args.json:
+        rows = combined.top_templates(args.top, args.sort)
+        with open(args.json, "w") as f:
+            json.dump(
+                [
+                    {"template": template, "calls": calls, "total_ns": total_ns}
+                    for template, calls, total_ns in rows
+                ],
+                f,
+                indent=4,
+            )
+    return 0
+
+
+def tracelog(args):
+    """Show the events in the per-process trace logs for `args.file`."""
+    from .tracelog import read_trace_log, trace_log_files
+
+    records = []
+    for part in trace_log_files(args.file):
+        header, part_records = read_trace_log(part)
+        print(f"{part}: {header['total']} events, the last {len(part_records)} kept")
+        records.extend(part_records)
+    if args.summary:
+        counts = collections.Counter(
+            (node_type, start == -1) for node_type, _, start, _ in records
+        )
+        print(f"{'node type':30} {'events':>10} {'no line':>10}")
+        for node_type in sorted({node_type for node_type, _ in counts}):
+            print(
+                f"{node_type:30} {counts[node_type, False] + counts[node_type, True]:10} "
+                f"{counts[node_type, True]:10}"
+            )
+    else:
+        for node_type, filename, start, end in records:
+            print(f"{filename}:{start}-{end} {node_type}")
+    return 0
+
+
+def hits(args):
+    """Combine the per-process hit counts for `args.file`, and report them."""
+    from .hitcount import HitCounts, html_report, text_report
+
+    counts = HitCounts.combine(args.file, keep=args.keep)
+    if args.html:
+        index = html_report(counts, args.html, top=args.top)
+        print(f"Wrote HTML report to {index}")
+    else:
+        text_report(counts, sys.stdout, top=args.top)
+    return 0
+
+
+def render_times(args):
+    """Combine the per-process render times for `args.file`, and report them."""
+    from .rendertime import RenderTimes, render_time_report
+
+    times = RenderTimes.combine(args.file, keep=args.keep)
+    render_time_report(times, sys.stdout, sort=args.sort, top=args.top)
+    return 0
+
+
+def queries(args):
+    """Combine the per-process query counts for `args.file`, and report them."""
+    from .queries import QueryCounts, query_report
+
+    counts = QueryCounts.combine(args.file, keep=args.keep)
+    query_report(counts, sys.stdout, sort=args.sort, top=args.top)
+    return 0
+
+
+def loops(args):
+    """Combine the per-process loop queries for `args.file`, and report them."""
+    from .loopqueries import LoopQueries, loop_query_report
+
+    found = LoopQueries.combine(args.file, keep=args.keep)
+    loop_query_report(found, sys.stdout, top=args.top)
+    return 0
+
+
+def cache(args):
+    """Combine the per-process cache stats for `args.file`, and report them."""
+    from .fragmentcache import CacheStats, cache_report
+
+    stats = CacheStats.combine(args.file, keep=args.keep)
+    cache_report(stats, sys.stdout, sort=args.sort, top=args.top)
+    return 0
+
+
+def allocations(args):
+    """Combine the per-process allocations for `args.file`, and report them."""
+    from .allocation import Allocations, allocation_report
+
+    found = Allocations.combine(args.file, keep=args.keep)
+    allocation_report(found, sys.stdout, sort=args.sort, top=args.top)
+    return 0
+
+
+def loads(args):
+    """Combine the per-process load times for `args.file`, and report them."""
+    from .loading import LoadTimes, load_report
+
+    times = LoadTimes.combine(args.file, keep=args.keep)
+    load_report(times, sys.stdout, sort=args.sort, top=args.top)
+    return 0
+
+
+def expressions(args):
+    """Combine the per-process expression times for `args.file`, and report them."""
+    from .expressions import ExpressionTimes, expression_report
+
+    times = ExpressionTimes.combine(args.file, keep=args.keep)
+    expression_report(times, sys.stdout, top=args.top)
+    return 0
+
+
+def stacks(args):
+    """Combine the per-process render stacks for `args.file`, and print them."""
+    from .flamegraph import RenderStacks
+
+    RenderStacks.combine(args.file, keep=args.keep)
+    with open(args.file, encoding="utf-8") as f:
+        sys.stdout.write(f.read())
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m django_coverage_plugin")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_analyze = subparsers.add_parser(
+        "analyze",
+        help="Write an index of the executable lines in templates.",
+    )
+    parser_analyze.add_argument(
+        "dirs", nargs="+", metavar="DIR",
+        help="Directories to search for templates.",
+    )
+    parser_analyze.add_argument(
+        "-o", "--output", default="template_lines.json",
+        help="The file to write the index to. [default: %(default)s]",
+    )
+    parser_analyze.add_argument(
+        "-e", "--extensions", default="html,htm,txt",
+        help="Comma-separated template file extensions. [default: %(default)s]",
+    )
+    parser_analyze.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="Number of processes to use. [default: the number of CPUs]",
+    )
+    parser_analyze.set_defaults(func=analyze)
+
+    parser_timings = subparsers.add_parser(
+        "timings",
+        help="Combine and summarize the callback timings from parallel processes.",
+    )
+    parser_timings.add_argument(
+        "file",
+        help="The timings file named in the plugin's configuration.",
+    )
+    parser_timings.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_timings.add_argument(
+        "--top", type=int, default=20,
+        help="How many templates to show. [default: %(default)s]",
+    )
+    parser_timings.add_argument(
+        "--sort", choices=["time", "calls"], default="time",
+        help="Order templates by tracing time or by callback calls. [default: %(default)s]",
+    )
+    parser_timings.add_argument(
+        "--json", metavar="FILE",
+        help="Also write the template report to FILE as JSON.",
+    )
+    parser_timings.set_defaults(func=timings)
+
+    parser_tracelog = subparsers.add_parser(
+        "tracelog",
+        help="Show the events in a trace log.",
+    )
+    parser_tracelog.add_argument(
+        "file",
+        help="The trace log file named in the plugin's configuration.  "
+             "The logs written by each process are all shown.",
+    )
+    parser_tracelog.add_argument(
+        "--summary", action="store_true",
+        help="Count the events for each node type, instead of listing them.",
+    )
+    parser_tracelog.set_defaults(func=tracelog)
+
+    parser_hits = subparsers.add_parser(
+        "hits",
+        help="Combine and report how many times each template line rendered.",
+    )
+    parser_hits.add_argument(
+        "file",
+        help="The hit counts file named in the plugin's configuration.",
+    )
+    parser_hits.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_hits.add_argument(
+        "--top", type=int, default=None,
+        help="Only report the templates with the most hits. [default: all]",
+    )
+    parser_hits.add_argument(
+        "--html", metavar="DIR",
+        help="Write an HTML report to DIR instead of a text report.",
+    )
+    parser_hits.set_defaults(func=hits)
+
+    parser_render_times = subparsers.add_parser(
+        "render-times",
+        help="Combine and report the time spent rendering each template line.",
+    )
+    parser_render_times.add_argument(
+        "file",
+        help="The render times file named in the plugin's configuration.",
+    )
+    parser_render_times.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_render_times.add_argument(
+        "--top", type=int, default=30,
+        help="How many lines to show. [default: %(default)s]",
+    )
+    parser_render_times.add_argument(
+        "--sort", choices=["exclusive", "inclusive", "calls"], default="exclusive",
+        help="Order lines by exclusive time, inclusive time, or renders. [default: %(default)s]",
+    )
+    parser_render_times.set_defaults(func=render_times)
+
+    parser_queries = subparsers.add_parser(
+        "queries",
+        help="Combine and report the database queries run by each template line.",
+    )
+    parser_queries.add_argument(
+        "file",
+        help="The query counts file named in the plugin's configuration.",
+    )
+    parser_queries.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_queries.add_argument(
+        "--top", type=int, default=30,
+        help="How many lines to show. [default: %(default)s]",
+    )
+    parser_queries.add_argument(
+        "--sort", choices=["queries", "time"], default="queries",
+        help="Order lines by number of queries or by query time. [default: %(default)s]",
+    )
+    parser_queries.set_defaults(func=queries)
+
+    parser_loops = subparsers.add_parser(
+        "loops",
+        help="Combine and report the loops that run a query on every iteration.",
+    )
+    parser_loops.add_argument(
+        "file",
+        help="The loop queries file named in the plugin's configuration.",
+    )
+    parser_loops.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_loops.add_argument(
+        "--top", type=int, default=30,
+        help="How many repeated queries to show. [default: %(default)s]",
+    )
+    parser_loops.set_defaults(func=loops)
+
+    parser_cache = subparsers.add_parser(
+        "cache",
+        help="Combine and report the hits and misses of {% cache %} tags.",
+    )
+    parser_cache.add_argument(
+        "file",
+        help="The cache stats file named in the plugin's configuration.",
+    )
+    parser_cache.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_cache.add_argument(
+        "--top", type=int, default=30,
+        help="How many lines to show. [default: %(default)s]",
+    )
+    parser_cache.add_argument(
+        "--sort", choices=["misses", "hits", "time"], default="misses",
+        help="Order lines by misses, hits, or time spent on misses. [default: %(default)s]",
+    )
+    parser_cache.set_defaults(func=cache)
+
+    parser_allocations = subparsers.add_parser(
+        "allocations",
+        help="Combine and report the memory allocated by each template line.",
+    )
+    parser_allocations.add_argument(
+        "file",
+        help="The allocations file named in the plugin's configuration.",
+    )
+    parser_allocations.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_allocations.add_argument(
+        "--top", type=int, default=30,
+        help="How many lines to show. [default: %(default)s]",
+    )
+    parser_allocations.add_argument(
+        "--sort", choices=["peak", "net", "renders"], default="peak",
+        help="Order lines by peak memory, net memory, or renders. [default: %(default)s]",
+    )
+    parser_allocations.set_defaults(func=allocations)
+
+    parser_loads = subparsers.add_parser(
+        "loads",
+        help="Combine and report the templates loaded by each template line.",
+    )
+    parser_loads.add_argument(
+        "file",
+        help="The load times file named in the plugin's configuration.",
+    )
+    parser_loads.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_loads.add_argument(
+        "--top", type=int, default=30,
+        help="How many lines to show. [default: %(default)s]",
+    )
+    parser_loads.add_argument(
+        "--sort", choices=["time", "loads", "compiles"], default="time",
+        help="Order lines by load time, loads, or compiles. [default: %(default)s]",
+    )
+    parser_loads.set_defaults(func=loads)
+
+    parser_expressions = subparsers.add_parser(
+        "expressions",
+        help="Combine and report the time spent in template expressions and filters.",
+    )
+    parser_expressions.add_argument(
+        "file",
+        help="The expression times file named in the plugin's configuration.",
+    )
+    parser_expressions.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_expressions.add_argument(
+        "--top", type=int, default=30,
+        help="How many expressions and filters to show. [default: %(default)s]",
+    )
+    parser_expressions.set_defaults(func=expressions)
+
+    parser_stacks = subparsers.add_parser(
+        "stacks",
+        help="Combine the render stacks, and print them as collapsed stacks for flame graphs.",
+    )
+    parser_stacks.add_argument(
+        "file",
+        help="The render stacks file named in the plugin's configuration.",
+    )
+    parser_stacks.add_argument(
+        "--keep", action="store_true",
+        help="Keep the per-process files after combining them.",
+    )
+    parser_stacks.set_defaults(func=stacks)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
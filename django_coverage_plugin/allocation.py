@@ -0,0 +1,98 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Memory allocated while rendering each template line.
+
+The allocation probe is a render probe that reads tracemalloc's traced memory
+as each node starts and finishes rendering.  Each line is charged the net
+memory its nodes allocated and still hold when they finish, summed over its
+renders, and the largest peak above the starting point during any one render.
+Peaks include the nodes rendered inside a node, like the body of a loop.
+Text nodes that are only whitespace aren't measured, as in the hit counter.
+
+tracemalloc is started when the probe starts, if it isn't already running.
+It slows everything down, and only sees memory allocated by Python.  Its
+totals and peak are for the whole process, so when templates render in more
+than one thread at once, their numbers are mixed together.
+
+"""
+
+import tracemalloc
+
+from . import plugin as plugin_module
+from .parallel import LineStats, source_line
+from .probes import Probe
+
+
+class Allocations(LineStats):
+    """Memory allocated by template lines: [renders, net_bytes, peak_bytes]."""
+
+    WIDTH = 3
+    MAX_COLUMNS = (2,)
+    DESCRIPTION = "allocations"
+
+    def rows(self, sort="peak"):
+        """A list of (filename, line, renders, net_bytes, peak_bytes).
+
+        Sorted by `sort`: "peak", "net", or "renders", biggest first.
+
+        """
+        return super().rows(["renders", "net", "peak"].index(sort))
+
+
+class AllocationProbe(Probe):
+    """A render probe measuring the memory allocated by each template line."""
+
+    def __init__(self):
+        super().__init__()
+        self.allocations = Allocations()
+        # The frames are [bytes traced at its start, the highest bytes traced
+        # since] for each node being rendered.
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def enter(self, node, where, context):
+        if type(node) is plugin_module.TextNode and node.s.isspace():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        frames = self.frames
+        if frames:
+            frames[-1][1] = max(frames[-1][1], peak)
+        # Start a new peak for this node.  Its parent has kept the old one.
+        tracemalloc.reset_peak()
+        frames.append([current, current])
+
+    def exit(self, node, where, context):
+        if type(node) is plugin_module.TextNode and node.s.isspace():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        frames = self.frames
+        start, highest = frames.pop()
+        highest = max(highest, peak)
+        if frames:
+            frames[-1][1] = max(frames[-1][1], highest)
+        stats = self.allocations.stats_for(where[0], where[1])
+        stats[0] += 1
+        stats[1] += current - start
+        stats[2] = max(stats[2], highest - start)
+
+    def save(self, filename):
+        self.allocations.save(filename)
+
+
+def allocation_report(allocations, outfile, sort="peak", top=None):
+    """Write a report of Allocations `allocations` to the open file `outfile`.
+
+    The `top` lines by `sort` are shown, or all of them, with their source.
+
+    """
+    sources = {}
+    outfile.write(f"{'renders':>10} {'net KiB':>10} {'peak KiB':>10}  line\n")
+    for filename, lineno, renders, net_bytes, peak_bytes in allocations.rows(sort)[:top]:
+        text = source_line(filename, lineno, sources)
+        outfile.write(
+            f"{renders:10} {net_bytes / 1024:10.1f} {peak_bytes / 1024:10.1f}  "
+            f"{filename}:{lineno}  {text[:60]}\n"
+        )
@@ -0,0 +1,142 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""The time spent resolving each template expression, and in each filter.
+
+Resolving ``{{ obj.a.b|filter }}`` looks up attributes, which can run
+expensive properties, and calls filters.  The expression probe is a render
+probe that wraps FilterExpression.resolve while a template renders.  Each
+resolve is timed and charged to the innermost node rendering and the
+expression's text, and each filter it calls is timed and charged to the same
+line and the filter's name.  Expression times include their filters.
+
+"""
+
+import functools
+import time
+
+from .parallel import NamedLineStats, source_line
+from .probes import PatchingProbe
+
+
+class ExpressionTimes(NamedLineStats):
+    """Times for expressions and filters.
+
+    Keyed by (filename, line, name), each has [calls, ns].  Names are the
+    text of an expression, or "|" and the name of a filter.
+
+    """
+
+    VERSION = 1
+    WIDTH = 2
+    DESCRIPTION = "expression times"
+
+    def rows(self):
+        """A list of (filename, line, name, calls, ns), slowest first."""
+        return super().rows(1)
+
+    def filter_totals(self):
+        """A list of (filter name, calls, ns) for the whole run, slowest first."""
+        totals = {}
+        for (_, _, name), (calls, ns) in self.stats.items():
+            if name.startswith("|"):
+                total = totals.setdefault(name[1:], [0, 0])
+                total[0] += calls
+                total[1] += ns
+        rows = [(name, calls, ns) for name, (calls, ns) in totals.items()]
+        rows.sort(key=lambda row: (-row[2], row[0]))
+        return rows
+
+
+class ExpressionProbe(PatchingProbe):
+    """A render probe timing expressions and filters on each template line."""
+
+    def __init__(self):
+        super().__init__()
+        self.times = ExpressionTimes()
+        self.clock = time.perf_counter_ns
+        # Maps filter functions, and our wrappers, to our wrappers.
+        self.timed_filters = {}
+        # Maps our wrappers, and filter functions, to the filter functions.
+        self.untimed_filters = {}
+
+    def patches(self):
+        from django.template.base import FilterExpression
+
+        return [(FilterExpression, "resolve", self._timed_resolve(FilterExpression.resolve))]
+
+    def _charge(self, name, start):
+        stack = self.hooks.stack
+        if stack:
+            filename, lineno, _ = stack[-1]
+            stats = self.times.stats_for(filename, lineno, name)
+            stats[0] += 1
+            stats[1] += self.clock() - start
+
+    def _timed_resolve(self, original):
+        """Make a FilterExpression.resolve that times itself and its filters."""
+        clock = self.clock
+        charge = self._charge
+        timed_filter = self._timed_filter
+        untimed_filters = self.untimed_filters
+
+        def resolve(fexpr, *args, **kwargs):
+            filters = fexpr.filters
+            if filters:
+                fexpr.filters = [(timed_filter(func), fargs) for func, fargs in filters]
+            start = clock()
+            try:
+                return original(fexpr, *args, **kwargs)
+            finally:
+                charge(fexpr.token, start)
+                if filters:
+                    # Another thread resolving the same expression might have
+                    # left our wrappers in `filters`: put the filters back.
+                    fexpr.filters = [
+                        (untimed_filters.get(func, func), fargs) for func, fargs in filters
+                    ]
+
+        return resolve
+
+    def _timed_filter(self, func):
+        """A wrapper for filter `func`, with the same flags, that times it."""
+        timed = self.timed_filters.get(func)
+        if timed is None:
+            name = "|" + getattr(func, "_filter_name", func.__name__)
+            clock = self.clock
+            charge = self._charge
+
+            # functools.wraps copies the flags like is_safe that resolve reads.
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    charge(name, start)
+
+            self.timed_filters[func] = self.timed_filters[timed] = timed
+            self.untimed_filters[func] = self.untimed_filters[timed] = func
+        return timed
+
+    def save(self, filename):
+        self.times.save(filename)
+
+
+def expression_report(times, outfile, top=None):
+    """Write a report of ExpressionTimes `times` to the open file `outfile`.
+
+    The `top` slowest expressions and filters are shown, or all of them,
+    with their source, followed by the total for each filter.
+
+    """
+    sources = {}
+    outfile.write(f"{'calls':>10} {'ms':>10}  {'expression':30}  line\n")
+    for filename, lineno, name, calls, ns in times.rows()[:top]:
+        text = source_line(filename, lineno, sources)
+        outfile.write(
+            f"{calls:10} {ns / 1e6:10.3f}  {name[:30]:30}  {filename}:{lineno}  {text[:60]}\n"
+        )
+    outfile.write(f"\n{'calls':>10} {'ms':>10}  filter\n")
+    for name, calls, ns in times.filter_totals()[:top]:
+        outfile.write(f"{calls:10} {ns / 1e6:10.3f}  {name}\n")
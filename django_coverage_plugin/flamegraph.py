@@ -0,0 +1,130 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Template render stacks, as collapsed stacks for flame graphs.
+
+The stack probe is a render probe that keeps a stack of the structural tags
+rendering: {% extends %}, {% block %}, {% include %}, {% for %} and {% if %}.
+Each frame is the tag's template file and line, under a frame for the
+top-level template rendered.  The time spent in each frame, without the frames
+inside it, is added up for each distinct stack.
+
+The data files are in the collapsed stack format that flamegraph.pl,
+speedscope and other flame graph tools read: a line for each stack, with the
+frames separated by semicolons, a space, and the time in microseconds.
+
+"""
+
+import time
+
+from .parallel import DataFile, data_error
+from .probes import Probe
+
+# The class names of the nodes that get frames, and their tag names.
+FRAME_TAGS = {
+    "ExtendsNode": "extends",
+    "BlockNode": "block",
+    "IncludeNode": "include",
+    "ForNode": "for",
+    "IfNode": "if",
+}
+
+
+class RenderStacks(DataFile):
+    """Microseconds spent in each stack of template frames.
+
+    The files are collapsed stacks rather than JSON, so they have no version.
+
+    """
+
+    DESCRIPTION = "render stacks"
+
+    def __init__(self, stacks=None):
+        # Maps collapsed stacks to microseconds.
+        self.stacks = stacks or {}
+
+    def add(self, stack, us):
+        self.stacks[stack] = self.stacks.get(stack, 0) + us
+
+    def update(self, other):
+        """Add the stacks from RenderStacks `other` into these."""
+        for stack, us in other.stacks.items():
+            self.add(stack, us)
+
+    def is_empty(self):
+        return not self.stacks
+
+    @classmethod
+    def read(cls, filename):
+        stacks = cls()
+        try:
+            with open(filename, encoding="utf-8") as f:
+                for lineno, line in enumerate(f, start=1):
+                    if not line.strip():
+                        continue
+                    stack, _, us = line.rstrip("\n").rpartition(" ")
+                    try:
+                        stacks.add(stack, int(us))
+                    except ValueError:
+                        raise data_error(
+                            f"Couldn't read {cls.DESCRIPTION} {filename}: "
+                            f"line {lineno} isn't a collapsed stack: {line!r}"
+                        )
+        except OSError as exc:
+            raise data_error(f"Couldn't read {cls.DESCRIPTION} {filename}: {exc}")
+        return stacks
+
+    def write(self, filename):
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, us in sorted(self.stacks.items()):
+                f.write(f"{stack} {us}\n")
+
+
+def frame_name(node, where):
+    """The flame graph frame for `node`, or None if it doesn't get one."""
+    tag = FRAME_TAGS.get(type(node).__name__)
+    if tag is None:
+        return None
+    if tag == "block":
+        tag = f"block {node.name}"
+    return f"{where[0]}:{where[1]} {tag}".replace(";", ":")
+
+
+class StackProbe(Probe):
+    """A render probe timing the stacks of structural tags."""
+
+    def __init__(self):
+        super().__init__()
+        # Nanoseconds for each stack, written as microseconds.
+        self.stacks = RenderStacks()
+        # The frames are [collapsed stack, start_ns, ns in its children, depth
+        # of the node that opened it] for each frame open.
+        self.clock = time.perf_counter_ns
+
+    def enter(self, node, where, context):
+        depth = len(self.hooks.stack)
+        names = []
+        if depth == 1:
+            names.append(where[0].replace(";", ":"))
+        name = frame_name(node, where)
+        if name is not None:
+            names.append(name)
+        frames = self.frames
+        for name in names:
+            stack = f"{frames[-1][0]};{name}" if frames else name
+            frames.append([stack, self.clock(), 0, depth])
+
+    def exit(self, node, where, context):
+        depth = len(self.hooks.stack)
+        frames = self.frames
+        while frames and frames[-1][3] == depth:
+            stack, start, child_ns, _ = frames.pop()
+            elapsed = self.clock() - start
+            if frames:
+                frames[-1][2] += elapsed
+            self.stacks.add(stack, elapsed - child_ns)
+
+    def save(self, filename):
+        RenderStacks({
+            stack: ns // 1000 for stack, ns in self.stacks.stacks.items()
+        }).save(filename)
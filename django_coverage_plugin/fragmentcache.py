@@ -0,0 +1,89 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Hit rates of {% cache %} fragments, for each template line.
+
+The cache probe is a render probe that watches the CacheNode renders.  A
+CacheNode only renders its contents when the fragment isn't in the cache, so
+a render that renders nothing inside it was a hit, and one that does was a
+miss.  The time spent rendering misses is recorded too.  A fragment that is
+empty counts as a hit every time.
+
+"""
+
+import time
+
+from .parallel import LineStats, source_line
+from .probes import Probe
+
+
+class CacheStats(LineStats):
+    """Fragment cache use by template lines: [hits, misses, miss_ns]."""
+
+    WIDTH = 3
+    DESCRIPTION = "cache stats"
+
+    def rows(self, sort="misses"):
+        """A list of (filename, line, hits, misses, miss_ns).
+
+        Sorted by `sort`: "hits", "misses", or "time", biggest first.
+
+        """
+        return super().rows(["hits", "misses", "time"].index(sort))
+
+
+class CacheProbe(Probe):
+    """A render probe counting the hits and misses of {% cache %} tags."""
+
+    def __init__(self):
+        super().__init__()
+        # CacheNode is looked up in start(): importing its module imports
+        # django.template.
+        self.cache_node_class = None
+        self.stats = CacheStats()
+        # The frames are [stack depth, start_ns, missed] for each CacheNode
+        # rendering.
+        self.clock = time.perf_counter_ns
+
+    def start(self):
+        from django.templatetags.cache import CacheNode
+
+        self.cache_node_class = CacheNode
+
+    def enter(self, node, where, context):
+        depth = len(self.hooks.stack)
+        frames = self.frames
+        if frames and depth == frames[-1][0] + 1:
+            # The fragment's contents are rendering: it wasn't cached.
+            frames[-1][2] = True
+        if isinstance(node, self.cache_node_class):
+            frames.append([depth, self.clock(), False])
+
+    def exit(self, node, where, context):
+        if isinstance(node, self.cache_node_class):
+            _, start, missed = self.frames.pop()
+            stats = self.stats.stats_for(where[0], where[1])
+            if missed:
+                stats[1] += 1
+                stats[2] += self.clock() - start
+            else:
+                stats[0] += 1
+
+    def save(self, filename):
+        self.stats.save(filename)
+
+
+def cache_report(stats, outfile, sort="misses", top=None):
+    """Write a report of CacheStats `stats` to the open file `outfile`.
+
+    The `top` lines by `sort` are shown, or all of them, with their source.
+
+    """
+    sources = {}
+    outfile.write(f"{'hits':>10} {'misses':>10} {'hit %':>7} {'miss ms':>10}  line\n")
+    for filename, lineno, hits, misses, miss_ns in stats.rows(sort)[:top]:
+        text = source_line(filename, lineno, sources)
+        outfile.write(
+            f"{hits:10} {misses:10} {hits / ((hits + misses) or 1):7.1%} "
+            f"{miss_ns / 1e6:10.3f}  {filename}:{lineno}  {text[:60]}\n"
+        )
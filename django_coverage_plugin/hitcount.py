@@ -0,0 +1,154 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Counts of how many times each template line rendered.
+
+Coverage only records that a line ran.  The hit counter is a render probe
+that counts every render of every node, charged to the lines the node covers,
+so hot loops and includes stand out.  A line with two nodes on it counts two
+for each pass over it.  Text nodes that are only whitespace aren't counted:
+they would double the count of every indented line.
+
+Reports show the template source from the plugin's FileReporter, with the
+count for each line.
+
+"""
+
+import hashlib
+import html
+import os
+import os.path
+
+from . import plugin as plugin_module
+from .parallel import LineStats
+from .probes import Probe
+
+
+class HitCounts(LineStats):
+    """Render counts for template lines: [hits]."""
+
+    VERSION = 1
+    DESCRIPTION = "hit counts"
+
+    def totals(self):
+        """A list of (filename, total hits), most hits first."""
+        totals = [
+            (filename, sum(stats[0] for stats in lines.values()))
+            for filename, lines in self.files.items()
+        ]
+        totals.sort(key=lambda row: (-row[1], row[0]))
+        return totals
+
+
+class HitCounter(Probe):
+    """A render probe counting the renders of each template line."""
+
+    def __init__(self):
+        super().__init__()
+        self.counts = HitCounts()
+
+    def enter(self, node, where, context):
+        if type(node) is plugin_module.TextNode and node.s.isspace():
+            return
+        filename, start, end = where
+        stats_for = self.counts.stats_for
+        for lineno in range(start, end+1):
+            stats_for(filename, lineno)[0] += 1
+
+    def save(self, filename):
+        self.counts.save(filename)
+
+
+def text_report(counts, outfile, top=None):
+    """Write a text report of HitCounts `counts` to the open file `outfile`.
+
+    The `top` templates with the most hits are shown, or all of them.
+
+    """
+    from .plugin import FileReporter
+
+    for filename, total in counts.totals()[:top]:
+        lines = counts.files[filename]
+        outfile.write(f"{filename}: {total} hits\n")
+        source = FileReporter(filename).source()
+        for lineno, text in enumerate(source.splitlines(), start=1):
+            count = lines[lineno][0] if lineno in lines else None
+            outfile.write(f"{lineno:6} {count if count else '':>10}  {text}\n")
+        outfile.write("\n")
+
+
+HTML_STYLE = """\
+body { font-family: sans-serif; }
+table { border-collapse: collapse; }
+td { padding: 0 .5em; vertical-align: top; }
+td.num, td.hits { text-align: right; color: #666; }
+td.src { font-family: monospace; white-space: pre; }
+.key { color: #008; font-weight: bold; }
+.nam { color: #080; }
+.com { color: #888; font-style: italic; }
+"""
+
+
+def html_page_name(filename):
+    """The name of the HTML page for template `filename`."""
+    digest = hashlib.sha1(filename.encode("utf-8")).hexdigest()[:8]
+    return f"{os.path.basename(filename)}_{digest}.html"
+
+
+def html_report(counts, directory, top=None):
+    """Write an HTML report of HitCounts `counts` into `directory`.
+
+    There's a page for each of the `top` templates with the most hits, or all
+    of them, with each line shaded by its share of the template's busiest
+    line.  Returns the name of the index page.
+
+    """
+    from .plugin import FileReporter
+
+    os.makedirs(directory, exist_ok=True)
+    index_rows = []
+    for filename, total in counts.totals()[:top]:
+        lines = counts.files[filename]
+        most = max(stats[0] for stats in lines.values())
+        rows = []
+        token_lines = FileReporter(filename).source_token_lines()
+        for lineno, tokens in enumerate(token_lines, start=1):
+            count = lines[lineno][0] if lineno in lines else 0
+            shade = ""
+            if count:
+                shade = f' style="background: rgba(255, 0, 0, {0.6 * count / most:.2f})"'
+            src = "".join(
+                f'<span class="{token_class}">{html.escape(text)}</span>'
+                for token_class, text in tokens
+            )
+            rows.append(
+                f'<tr{shade}><td class="num">{lineno}</td>'
+                f'<td class="hits">{count or ""}</td><td class="src">{src}</td></tr>'
+            )
+        page = html_page_name(filename)
+        write_html_page(
+            os.path.join(directory, page),
+            f"Hit counts: {filename}",
+            f"<p>{total} hits</p>\n<table>\n" + "\n".join(rows) + "\n</table>",
+        )
+        index_rows.append(
+            f'<tr><td class="hits">{total}</td>'
+            f'<td><a href="{html.escape(page)}">{html.escape(filename)}</a></td></tr>'
+        )
+
+    index = os.path.join(directory, "index.html")
+    write_html_page(
+        index,
+        "Template hit counts",
+        "<table>\n" + "\n".join(index_rows) + "\n</table>",
+    )
+    return index
+
+
+def write_html_page(path, title, body):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{html.escape(title)}</title>\n<style>\n{HTML_STYLE}</style>\n"
+            f"</head>\n<body>\n<h1>{html.escape(title)}</h1>\n{body}\n</body>\n</html>\n"
+        )
@@ -0,0 +1,130 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Pre-computed indexes of the executable lines in templates.
+
+Finding the executable lines of a template means lexing the whole thing.  A
+line index records the result for a tree of templates once, so that many
+reporting processes can share it.  Entries are keyed by a digest of the
+template source, so the index stays valid no matter where the tree is checked
+out, and an edited template simply isn't found in it.
+
+"""
+
+import concurrent.futures
+import hashlib
+import json
+
+from .parallel import DataFile
+
+
+def source_digest(text):
+    """A digest of template source `text`, used as the key in a line index."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def lines_to_ranges(lines):
+    """Compress a set of line numbers into a sorted list of [start, end] pairs."""
+    ranges = []
+    for lineno in sorted(lines):
+        if ranges and ranges[-1][1] == lineno - 1:
+            ranges[-1][1] = lineno
+        else:
+            ranges.append([lineno, lineno])
+    return ranges
+
+
+def ranges_to_lines(ranges):
+    """The set of line numbers in a list of [start, end] pairs."""
+    lines = set()
+    for start, end in ranges:
+        lines.update(range(start, end+1))
+    return lines
+
+
+class LineIndex(DataFile):
+    """A mapping from template source digests to executable line numbers."""
+
+    DESCRIPTION = "line index"
+
+    def __init__(self, entries=None):
+        # Maps source digests to lists of [start, end] line ranges.
+        self.entries = entries or {}
+
+    def update(self, other):
+        self.entries.update(other.entries)
+
+    def is_empty(self):
+        return not self.entries
+
+    def to_json(self):
+        return {"lines": self.entries}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data["lines"])
+
+    def write(self, filename):
+        # Indexes of big trees are big, so they are written compactly.
+        with open(filename, "w") as f:
+            json.dump(
+                {"version": self.VERSION, **self.to_json()},
+                f,
+                separators=(",", ":"),
+                sort_keys=True,
+            )
+
+    def add(self, digest, lines):
+        self.entries[digest] = lines_to_ranges(lines)
+
+    def lines_for(self, source):
+        """The executable lines for template `source`, or None if unknown."""
+        ranges = self.entries.get(source_digest(source))
+        if ranges is None:
+            return None
+        return ranges_to_lines(ranges)
+
+
+def analyze_file(filename):
+    """Find the executable lines of one template.
+
+    Returns a tuple: the filename, the digest of its source, and the sorted
+    list of executable lines.  If the file can't be read, the digest is None
+    and the last element is the error message.
+
+    """
+    from .plugin import FileReporter, NoSource
+
+    reporter = FileReporter(filename)
+    try:
+        source = reporter.source()
+    except NoSource as exc:
+        return filename, None, str(exc)
+    return filename, source_digest(source), sorted(reporter.lines())
+
+
+def build_index(filenames, jobs=None):
+    """Analyze all of `filenames`, in `jobs` parallel processes.
+
+    Returns a `LineIndex`, and a list of (filename, message) pairs for the
+    files that couldn't be analyzed.
+
+    """
+    index = LineIndex()
+    errors = []
+    if jobs == 1:
+        results = map(analyze_file, filenames)
+        executor = None
+    else:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(analyze_file, filenames, chunksize=16)
+    try:
+        for filename, digest, lines in results:
+            if digest is None:
+                errors.append((filename, lines))
+            else:
+                index.add(digest, lines)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return index, errors
@@ -0,0 +1,222 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""A store of template line maps, shared by processes.
+
+Parallel test workers all read and line-map the same templates.  With a
+shared store, a worker that makes a line map appends it to a file, and the
+others find it there instead of reading the template.
+
+The file is only ever appended to, without locks.  Each record is written
+with a single write to a file opened for appending, so records from
+different processes don't interleave on local file systems.  Each record has
+a checksum, and readers skip records that are damaged, or wait for ones that
+aren't finished yet.
+
+Readers keep the file mapped into memory, so its pages are shared by all the
+processes using it.  They only index the records added since they last
+looked, by template, and decode a line map when it's asked for.
+
+Line maps are found by the template's file name, modification time and size,
+so an edited template isn't found, and the store can be kept between runs.
+When a store is opened and most of its records are out of date, it's
+rewritten with only the current ones.  Other processes with the store open
+notice the new file the next time they look, and start reading and appending
+to it.  Records appended while it's being rewritten are lost, and made again
+when next needed.
+
+"""
+
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+# Each record is a header: the magic, a checksum of the rest, the number of
+# bytes in the key, and the number of offsets in the line map.  Then the key
+# in UTF-8, and the offsets as little-endian 32-bit numbers.
+RECORD_MAGIC = b"DCLM"
+RECORD_HEADER = struct.Struct("<4sIII")
+
+# A store is only compacted if it has at least this many stale records:
+# records for a template that have been replaced by a newer version.
+MIN_STALE_RECORDS = 100
+
+
+def store_key(filename, stat):
+    """The key for the line map of `filename`, with its os.stat() result `stat`."""
+    return f"{filename}\0{stat.st_mtime_ns}\0{stat.st_size}"
+
+
+def make_record(key, line_map):
+    """The bytes of a record for line map `line_map` with key `key`."""
+    key_bytes = key.encode("utf-8")
+    rest = struct.pack("<II", len(key_bytes), len(line_map))
+    rest += key_bytes + struct.pack(f"<{len(line_map)}I", *line_map)
+    return struct.pack("<4sI", RECORD_MAGIC, zlib.crc32(rest)) + rest
+
+
+class LineMapStore:
+    """Line maps in a file that many processes append to."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        # Maps template filenames to (key, offset, count): the key of their
+        # latest record, and where its `count` line map offsets are in the
+        # file.
+        self.index = {}
+        # How much of the file has been read, and how many of its records were
+        # for older versions of templates.  Copies of the same line map, from
+        # workers racing to make it, aren't stale.
+        self.offset = 0
+        self.stale = 0
+        # The open file, and its memory map, once there is one.
+        self.file = None
+        self.data = None
+        # The file descriptor for appending, opened when first needed.
+        self.fd = None
+
+    def get(self, filename, stat):
+        """The stored line map for `filename`, or None if there isn't one."""
+        key = store_key(filename, stat)
+        entry = self.index.get(filename)
+        if entry is None or entry[0] != key:
+            self.refresh()
+            entry = self.index.get(filename)
+            if entry is None or entry[0] != key:
+                return None
+        _, offset, count = entry
+        return list(struct.unpack_from(f"<{count}I", self.data, offset))
+
+    def refresh(self):
+        """Index the records added to the file since it was last read."""
+        opening = self.data is None
+        if not self.map_file():
+            return
+        self.offset = self._read_records(self.data, self.offset)
+        if opening and self.stale >= max(len(self.index), MIN_STALE_RECORDS):
+            self.compact()
+
+    def map_file(self):
+        """Map all of the file into memory.  Returns False if there's nothing new to map."""
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            return False
+        if self.file is not None and os.fstat(self.file.fileno()).st_ino != stat.st_ino:
+            # Another process compacted the store: start again with the new file.
+            self.reset()
+        if self.file is None:
+            try:
+                self.file = open(self.filename, "rb")
+            except OSError:
+                return False
+        # The file might have been replaced again since we looked: only map
+        # what's in the file we have open.
+        size = os.fstat(self.file.fileno()).st_size
+        if size <= self.offset:
+            return False
+        if self.data is not None and len(self.data) >= size:
+            return True
+        if self.data is not None:
+            self.data.close()
+        self.data = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+        return True
+
+    def _read_records(self, data, offset):
+        """Index the records in `data` from `offset`.
+
+        Returns the offset to read from next time: the end of the data, or
+        the start of a record that isn't all written yet.
+
+        """
+        end = len(data)
+        while offset + RECORD_HEADER.size <= end:
+            magic, checksum, key_len, map_len = RECORD_HEADER.unpack_from(data, offset)
+            body_start = offset + RECORD_HEADER.size
+            body_end = body_start + key_len + 4 * map_len
+            if magic == RECORD_MAGIC and body_end > end:
+                # Not all written yet, or damaged.  Look again next time.
+                break
+            if magic == RECORD_MAGIC and checksum == zlib.crc32(data[offset+8:body_end]):
+                key = data[body_start:body_start+key_len].decode("utf-8")
+                filename = key.partition("\0")[0]
+                entry = self.index.get(filename)
+                if entry is not None and entry[0] != key:
+                    self.stale += 1
+                self.index[filename] = (key, body_start + key_len, map_len)
+                offset = body_end
+                continue
+            # Damaged: skip to the next record.
+            offset = data.find(RECORD_MAGIC, offset + 1)
+            if offset < 0:
+                offset = end
+        return offset
+
+    def compact(self):
+        """Rewrite the file with only the records for templates as they are now."""
+        records = []
+        for filename, (key, offset, count) in self.index.items():
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            if store_key(filename, stat) == key:
+                line_map = struct.unpack_from(f"<{count}I", self.data, offset)
+                records.append(make_record(key, line_map))
+        self.close()
+        temp = f"{self.filename}.{os.getpid()}.tmp"
+        try:
+            with open(temp, "wb") as f:
+                f.writelines(records)
+            os.replace(temp, self.filename)
+        except OSError:
+            # Another process might have the file open on a system that won't
+            # replace it.  The stale records are harmless, so keep them.
+            if os.path.exists(temp):
+                os.remove(temp)
+        self.reset()
+        if self.map_file():
+            self.offset = self._read_records(self.data, 0)
+
+    def reset(self):
+        """Close the file, and forget what was read from it."""
+        self.close()
+        self.index = {}
+        self.offset = self.stale = 0
+
+    def close(self):
+        """Close the file and its memory map."""
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def append(self, filename, stat, line_map):
+        """Add the line map for `filename` to the store."""
+        record = make_record(store_key(filename, stat), line_map)
+        if self.fd is not None:
+            try:
+                replaced = os.fstat(self.fd).st_ino != os.stat(self.filename).st_ino
+            except OSError:
+                replaced = True
+            if replaced:
+                # The store was compacted: append to the new file.
+                os.close(self.fd)
+                self.fd = None
+        if self.fd is None:
+            self.fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        os.write(self.fd, record)
+
+    def index_bytes(self):
+        """The bytes used by the index, for memory accounting."""
+        return sys.getsizeof(self.index) + sum(
+            sys.getsizeof(filename) + sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for filename, entry in self.index.items()
+        )
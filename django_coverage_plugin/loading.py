@@ -0,0 +1,103 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""The cost of loading templates at render time, for each template line.
+
+{% include %} and {% extends %} load their templates while rendering.  Without
+the cached loader, every load searches the template directories and compiles
+the template again.  The load probe is a render probe that wraps the engine's
+find_template and the compiler while a template renders, and charges each
+load, and each compile, to the innermost node rendering: the tag that asked
+for the template.
+
+Loads of the top-level template, before it renders, aren't seen.
+
+"""
+
+import time
+
+from .parallel import LineStats, source_line
+from .probes import PatchingProbe
+
+
+class LoadTimes(LineStats):
+    """Template loads by template lines: [loads, load_ns, compiles, compile_ns].
+
+    Load times include the compile times.
+
+    """
+
+    WIDTH = 4
+    DESCRIPTION = "load times"
+
+    def rows(self, sort="time"):
+        """A list of (filename, line, loads, load_ns, compiles, compile_ns).
+
+        Sorted by `sort`: "time", "loads", or "compiles", biggest first.
+
+        """
+        return super().rows(["loads", "time", "compiles"].index(sort))
+
+
+class LoadProbe(PatchingProbe):
+    """A render probe charging template loads to the tags that ran them."""
+
+    def __init__(self):
+        super().__init__()
+        self.times = LoadTimes()
+        self.clock = time.perf_counter_ns
+
+    def patches(self):
+        from django.template.base import Template
+        from django.template.engine import Engine
+
+        return [
+            (Engine, "find_template", self._timed(Engine.find_template, 0)),
+            (Template, "compile_nodelist", self._timed(Template.compile_nodelist, 2)),
+        ]
+
+    def _timed(self, original, index):
+        """Make a method charging calls of `original` to the rendering line.
+
+        The count and time are added to the line's numbers at `index`.
+
+        """
+        hooks = self.hooks
+        clock = self.clock
+        times = self.times
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                # Other threads might load templates without rendering one.
+                stack = hooks.stack
+                if stack:
+                    filename, lineno, _ = stack[-1]
+                    stats = times.stats_for(filename, lineno)
+                    stats[index] += 1
+                    stats[index + 1] += clock() - start
+
+        return timed
+
+    def save(self, filename):
+        self.times.save(filename)
+
+
+def load_report(times, outfile, sort="time", top=None):
+    """Write a report of LoadTimes `times` to the open file `outfile`.
+
+    The `top` lines by `sort` are shown, or all of them, with their source.
+
+    """
+    sources = {}
+    outfile.write(
+        f"{'loads':>10} {'load ms':>10} {'compiles':>10} {'compile ms':>10}  line\n"
+    )
+    for filename, lineno, loads, load_ns, compiles, compile_ns in times.rows(sort)[:top]:
+        text = source_line(filename, lineno, sources)
+        outfile.write(
+            f"{loads:10} {load_ns / 1e6:10.3f} {compiles:10} {compile_ns / 1e6:10.3f}  "
+            f"{filename}:{lineno}  {text[:60]}\n"
+        )
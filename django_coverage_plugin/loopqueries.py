@@ -0,0 +1,135 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Finding {% for %} loops that run the same query on every iteration.
+
+This is the "N+1 queries" problem: a loop over N objects that runs one more
+query for each of them, usually by following a relation that wasn't
+prefetched.  The loop detector is a query probe that keeps track of the
+{% for %} nodes rendering.  Each query is charged to the innermost loop that
+is iterating, and to the iteration it ran in.  A loop finding its sequence
+isn't iterating yet, so ``{% for book in author.books.all %}`` inside a loop
+over authors charges its query to the authors loop.  When a loop finishes,
+any query shape that ran in at least MIN_ITERATIONS different iterations is
+recorded.
+
+Query shapes are the SQL with parameter placeholders, with literal numbers
+and lists of placeholders collapsed, so that the same query for different
+objects has the same shape.
+
+"""
+
+import re
+
+from .parallel import NamedLineStats, source_line
+from .queries import QueryProbe
+
+# A query has to run in this many iterations of a loop to be reported.
+MIN_ITERATIONS = 2
+
+
+def query_shape(sql):
+    """Normalize `sql` so that the same query with different values matches."""
+    sql = re.sub(r"\s+", " ", sql.strip())
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    sql = re.sub(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)", "(...)", sql)
+    return sql
+
+
+class LoopQueries(NamedLineStats):
+    """Queries repeated in loops.
+
+    Keyed by (filename, line, query shape), each has [renders, most
+    iterations, queries]: the number of times the loop rendered with the
+    query repeated, the largest number of iterations it ran in, and the total
+    number of times it ran.
+
+    """
+
+    VERSION = 1
+    WIDTH = 3
+    MAX_COLUMNS = (1,)
+    DESCRIPTION = "loop queries"
+
+    def add(self, filename, lineno, shape, iterations, queries):
+        stats = self.stats_for(filename, lineno, shape)
+        stats[0] += 1
+        stats[1] = max(stats[1], iterations)
+        stats[2] += queries
+
+    def rows(self):
+        """A list of (filename, line, shape, renders, iterations, queries).
+
+        The most repeated queries are first.
+
+        """
+        return super().rows(2)
+
+
+class LoopQueryDetector(QueryProbe):
+    """A query probe finding loops that repeat a query in each iteration."""
+
+    def __init__(self):
+        super().__init__()
+        # Found when the probe starts, so that making the plugin doesn't import
+        # Django's templates.
+        self.for_node_class = None
+        self.found = LoopQueries()
+        # The frames are, for each {% for %} rendering: its `where`, its
+        # context, the forloop of any enclosing loop, and a dict mapping query
+        # shapes to the iterations they ran in.
+
+    def start(self):
+        super().start()
+        from django.template.defaulttags import ForNode
+
+        self.for_node_class = ForNode
+
+    def enter(self, node, where, context):
+        super().enter(node, where, context)
+        if isinstance(node, self.for_node_class):
+            self.frames.append((where, context, context.get("forloop"), {}))
+
+    def exit(self, node, where, context):
+        if isinstance(node, self.for_node_class):
+            self.finish_loop(*self.frames.pop())
+        super().exit(node, where, context)
+
+    def query(self, sql, ns):
+        for _, context, outer, shapes in reversed(self.frames):
+            forloop = context.get("forloop")
+            if forloop is not None and forloop is not outer:
+                shapes.setdefault(query_shape(sql), []).append(forloop["counter"])
+                return
+            # Not iterating yet: the loop is still finding its sequence, so
+            # the query belongs to the loop around it, if any.
+
+    def finish_loop(self, where, context, outer, shapes):
+        filename, lineno, _ = where
+        for shape, iterations in shapes.items():
+            distinct = len(set(iterations))
+            if distinct >= MIN_ITERATIONS:
+                self.found.add(filename, lineno, shape, distinct, len(iterations))
+
+    def save(self, filename):
+        self.found.save(filename)
+
+
+def loop_query_report(found, outfile, top=None):
+    """Write a report of LoopQueries `found` to the open file `outfile`.
+
+    The `top` most repeated queries are shown, or all of them, with the source
+    of their loops.
+
+    """
+    sources = {}
+    rows = found.rows()[:top]
+    if not rows:
+        outfile.write("No queries repeated in loops.\n")
+    for filename, lineno, shape, renders, iterations, queries in rows:
+        text = source_line(filename, lineno, sources)
+        outfile.write(f"{filename}:{lineno}  {text}\n")
+        outfile.write(
+            f"    {queries} queries in {renders} renders, "
+            f"up to {iterations} iterations: {shape}\n"
+        )
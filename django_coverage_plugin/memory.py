@@ -0,0 +1,67 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Accounting for the memory held in the plugin's caches.
+
+The plugin keeps a line map for every template it traces, and each file
+reporter keeps the source of its template.  For a large tree of templates
+these add up, so this measures them.  Sizes are from sys.getsizeof, so they
+count the objects themselves, not allocator overhead.
+
+"""
+
+import array
+import sys
+
+
+def line_map_bytes(line_map):
+    """The bytes used by a line map: the list and the offsets in it."""
+    if isinstance(line_map, array.array):
+        # Warmed-up line maps are arrays, the offsets aren't objects.
+        return sys.getsizeof(line_map)
+    return sys.getsizeof(line_map) + sum(sys.getsizeof(offset) for offset in line_map)
+
+
+def memory_usage(plugin):
+    """Measure the memory held by `plugin` and its live file reporters.
+
+    Returns a list of (cache, filename, bytes) tuples, largest first.
+
+    """
+    usage = []
+    for filename, line_map in plugin.source_map.items():
+        usage.append(("line_map", filename, sys.getsizeof(filename) + line_map_bytes(line_map)))
+    for reporter in list(plugin.file_reporters.values()):
+        if reporter._source is not None:
+            usage.append(("source", reporter.filename, sys.getsizeof(reporter._source)))
+    if plugin.line_index is not None:
+        entries = plugin.line_index.entries
+        index_bytes = sys.getsizeof(entries) + sum(
+            sys.getsizeof(digest) + sys.getsizeof(ranges) + sum(
+                sys.getsizeof(pair) for pair in ranges
+            )
+            for digest, ranges in entries.items()
+        )
+        usage.append(("line_index", plugin.line_index_file, index_bytes))
+    if plugin.line_map_store is not None:
+        # The store's file is mapped, and shared with other processes: only
+        # its index is ours.
+        store = plugin.line_map_store
+        usage.append(("line_store", plugin.line_map_store_file, store.index_bytes()))
+    usage.sort(key=lambda row: (-row[2], row[0], row[1]))
+    return usage
+
+
+def memory_report(usage):
+    """Lines of text reporting the `usage` from memory_usage()."""
+    totals = {}
+    for cache, _, size in usage:
+        totals[cache] = totals.get(cache, 0) + size
+    lines = [f"{'cache':10} {'bytes':>12}  file"]
+    for cache, filename, size in usage:
+        lines.append(f"{cache:10} {size:12}  {filename}")
+    lines.append("")
+    for cache, size in sorted(totals.items()):
+        lines.append(f"{cache:10} {size:12}  total")
+    lines.append(f"{'all':10} {sum(totals.values()):12}  total")
+    return lines
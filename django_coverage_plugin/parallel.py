@@ -0,0 +1,240 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Data files written by each process, and combined afterwards.
+
+Like coverage's own parallel data files, each process writes to the
+configured file name with its host name and process id added.  Combining
+reads them all, and the configured file if it exists, into one.
+
+"""
+
+import glob
+import json
+import os
+import socket
+
+
+def process_filename(filename):
+    """The file for this process to write, named from `filename`."""
+    return f"{filename}.{socket.gethostname()}.{os.getpid()}"
+
+
+def combine_files(filename, data, read, keep=False):
+    """Combine the per-process files for `filename` into `data`.
+
+    `data` is updated with the result of `read(name)` for `filename` if it
+    exists, and for each per-process file, then written to `filename`.  The
+    per-process files are deleted unless `keep` is true.  Returns `data`.
+
+    """
+    if os.path.exists(filename):
+        data.update(read(filename))
+    parts = sorted(glob.glob(glob.escape(filename) + ".*"))
+    for part in parts:
+        data.update(read(part))
+    data.write(filename)
+    if not keep:
+        for part in parts:
+            os.remove(part)
+    return data
+
+
+def source_line(filename, lineno, sources):
+    """The stripped text of line `lineno` of template `filename`.
+
+    `sources` is a dict used to cache the lines of templates already read.
+
+    """
+    if filename not in sources:
+        from .plugin import FileReporter
+        sources[filename] = FileReporter(filename).source().splitlines()
+    source_lines = sources[filename]
+    return source_lines[lineno-1].strip() if lineno <= len(source_lines) else ""
+
+
+def data_error(message):
+    """A DjangoTemplatePluginException for a problem with a data file."""
+    # Import this late, the plugin module imports us.
+    from .plugin import DjangoTemplatePluginException
+
+    return DjangoTemplatePluginException(message)
+
+
+class DataFile:
+    """Data saved by each process, and combined afterwards.
+
+    Subclasses convert their data to and from JSON, and add other data into
+    theirs.  Files are JSON with the format version added.
+
+    """
+
+    VERSION = 1
+    DESCRIPTION = "data"
+
+    def update(self, other):
+        """Add the data from `other` into this."""
+        raise NotImplementedError
+
+    def is_empty(self):
+        """Is there no data, so nothing to save?"""
+        raise NotImplementedError
+
+    def to_json(self):
+        """A dict of the data to write, without the version."""
+        raise NotImplementedError
+
+    @classmethod
+    def from_json(cls, data):
+        """Make an instance from a dict read from a file."""
+        raise NotImplementedError
+
+    @classmethod
+    def read(cls, filename):
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise data_error(f"Couldn't read {cls.DESCRIPTION} {filename}: {exc}")
+        if data.get("version") != cls.VERSION:
+            raise data_error(
+                f"{cls.DESCRIPTION.capitalize()} {filename} have an unsupported version: "
+                f"{data.get('version')!r}"
+            )
+        return cls.from_json(data)
+
+    def write(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"version": self.VERSION, **self.to_json()}, f, sort_keys=True)
+
+    def save(self, filename):
+        """Write to a file for this process, named from `filename`.
+
+        Nothing is written if nothing was recorded, so that processes that
+        didn't render templates, like ``coverage report``, leave no files.
+
+        """
+        if not self.is_empty():
+            self.write(process_filename(filename))
+
+    @classmethod
+    def combine(cls, filename, keep=False):
+        """Combine the per-process files for `filename` into `filename`."""
+        return combine_files(filename, cls(), cls.read, keep=keep)
+
+
+def add_stats(totals, stats, max_columns=()):
+    """Add the list of numbers `stats` into `totals`.
+
+    The numbers in the `max_columns` positions keep the larger value instead.
+
+    """
+    for i, value in enumerate(stats):
+        if i in max_columns:
+            totals[i] = max(totals[i], value)
+        else:
+            totals[i] += value
+
+
+class LineStats(DataFile):
+    """Lists of numbers for template lines, saved by each process.
+
+    Subclasses say how many numbers each line has, which of them are maximums
+    rather than totals, and what the data is called in error messages.
+
+    """
+
+    # The number of numbers per line, and the positions of those combined by
+    # keeping the largest.
+    WIDTH = 1
+    MAX_COLUMNS = ()
+    DESCRIPTION = "line stats"
+
+    def __init__(self, files=None):
+        # Maps filenames to dicts mapping line numbers to lists of WIDTH
+        # numbers.
+        self.files = files or {}
+
+    def stats_for(self, filename, lineno):
+        """The list of numbers for `lineno` in `filename`, to update."""
+        lines = self.files.get(filename)
+        if lines is None:
+            lines = self.files[filename] = {}
+        stats = lines.get(lineno)
+        if stats is None:
+            stats = lines[lineno] = [0] * self.WIDTH
+        return stats
+
+    def update(self, other):
+        """Add the numbers from `other` into these."""
+        for filename, lines in other.files.items():
+            for lineno, stats in lines.items():
+                add_stats(self.stats_for(filename, lineno), stats, self.MAX_COLUMNS)
+
+    def is_empty(self):
+        return not self.files
+
+    def rows(self, index=0):
+        """A list of (filename, line, *numbers), biggest number `index` first."""
+        rows = [
+            (filename, lineno, *stats)
+            for filename, lines in self.files.items()
+            for lineno, stats in lines.items()
+        ]
+        rows.sort(key=lambda row: (-row[index+2], row[0], row[1]))
+        return rows
+
+    def to_json(self):
+        return {"files": self.files}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({
+            template: {int(lineno): stats for lineno, stats in lines.items()}
+            for template, lines in data["files"].items()
+        })
+
+
+class NamedLineStats(DataFile):
+    """Lists of numbers for named things on template lines.
+
+    Like LineStats, but keyed by (filename, line, name), for data about more
+    than one thing on a line, like queries or expressions.
+
+    """
+
+    WIDTH = 1
+    MAX_COLUMNS = ()
+    DESCRIPTION = "named line stats"
+
+    def __init__(self, stats=None):
+        # Maps (filename, line, name) to lists of WIDTH numbers.
+        self.stats = stats or {}
+
+    def stats_for(self, filename, lineno, name):
+        """The list of numbers for `name` on `lineno` in `filename`, to update."""
+        stats = self.stats.get((filename, lineno, name))
+        if stats is None:
+            stats = self.stats[filename, lineno, name] = [0] * self.WIDTH
+        return stats
+
+    def update(self, other):
+        """Add the numbers from `other` into these."""
+        for key, stats in other.stats.items():
+            add_stats(self.stats_for(*key), stats, self.MAX_COLUMNS)
+
+    def is_empty(self):
+        return not self.stats
+
+    def rows(self, index=0):
+        """A list of (filename, line, name, *numbers), biggest number `index` first."""
+        rows = [(*key, *stats) for key, stats in self.stats.items()]
+        rows.sort(key=lambda row: (-row[index+3], row[0], row[1], row[2]))
+        return rows
+
+    def to_json(self):
+        return {"stats": sorted([*key, *stats] for key, stats in self.stats.items())}
+
+    @classmethod
+    def from_json(cls, data):
+        return cls({tuple(row[:3]): row[3:] for row in data["stats"]})
@@ -3,43 +3,76 @@
 
 """The Django template coverage plugin."""
 
+import atexit
+import bisect
+import collections
+import fnmatch
+import importlib.util
 import os.path
 import re
+import sys
+import weakref
 
 try:
     from coverage.exceptions import NoSource
 except ImportError:
     # for coverage 5.x
     from coverage.misc import NoSource
+
 import coverage.plugin
 import django
-import django.template
-from django.template.base import Lexer, NodeList, Template, TextNode
-from django.template.defaulttags import VerbatimNode
-from django.templatetags.i18n import BlockTranslateNode
 
-try:
-    from django.template.base import TokenType
+from .index import LineIndex
+from .memory import memory_report, memory_usage
 
-    def _token_name(token_type):
-        token_type.name.capitalize()
+# The Django template machinery is imported by load_django_template() the
+# first time we need it: when a template node is first rendered, or when a
+# template is reported on.  Coverage runs that never touch a template don't
+# pay to import it.  It can't be imported when we claim a file, because that
+# happens while django.template itself is being imported.
+Lexer = NodeList = Template = TextNode = tag_re = None
+VerbatimNode = BlockTranslateNode = None
+TokenType = _token_name = None
 
-except ImportError:
-    # Django <2.1 uses separate constants for token types
-    from django.template.base import (
-        TOKEN_BLOCK,
-        TOKEN_MAPPING,
-        TOKEN_TEXT,
-        TOKEN_VAR,
-    )
 
-    class TokenType:
-        TEXT = TOKEN_TEXT
-        VAR = TOKEN_VAR
-        BLOCK = TOKEN_BLOCK
+def load_django_template():
+    """Import the parts of Django's template engine that the plugin uses."""
+    global Lexer, NodeList, Template, TextNode, tag_re
+    global VerbatimNode, BlockTranslateNode
+    global TokenType, _token_name
+
+    if Lexer is not None:
+        return
+
+    from django.template.base import NodeList, Template, TextNode, tag_re
+    from django.template.defaulttags import VerbatimNode
+    from django.templatetags.i18n import BlockTranslateNode
+
+    try:
+        from django.template.base import TokenType
+
+        def _token_name(token_type):
+            token_type.name.capitalize()
+
+    except ImportError:
+        # Django <2.1 uses separate constants for token types
+        from django.template.base import (
+            TOKEN_BLOCK,
+            TOKEN_MAPPING,
+            TOKEN_TEXT,
+            TOKEN_VAR,
+        )
+
+        class TokenType:
+            TEXT = TOKEN_TEXT
+            VAR = TOKEN_VAR
+            BLOCK = TOKEN_BLOCK
 
-    def _token_name(token_type):
-        return TOKEN_MAPPING[token_type]
+        def _token_name(token_type):
+            return TOKEN_MAPPING[token_type]
+
+    # Lexer is assigned last: it's what we check to see if we're loaded.
+    from django.template.base import Lexer
 
 
 class DjangoTemplatePluginException(Exception):
@@ -47,9 +80,22 @@ class DjangoTemplatePluginException(Exception):
     pass
 
 
-# For debugging the plugin itself.
+# For debugging the plugin itself.  To see what happens while tracing, use the
+# trace_log option.
 SHOW_PARSING = False
-SHOW_TRACING = False
+
+
+# check_debug() remembers a successful check here, so that once settings are
+# ready, checking again costs nothing.  It's forgotten if the TEMPLATES setting
+# changes, so that new engines get checked.
+_debug_checked = False
+
+
+def _forget_debug_check(setting, **kwargs):
+    """A `setting_changed` receiver to make check_debug check again."""
+    global _debug_checked
+    if setting == "TEMPLATES":
+        _debug_checked = False
 
 
 def check_debug():
@@ -61,6 +107,10 @@ def check_debug():
 
     Returns True if the debug check was performed, False otherwise
     """
+    global _debug_checked
+    if _debug_checked:
+        return True
+
     from django.conf import settings
 
     if not settings.configured:
@@ -68,6 +118,7 @@ def check_debug():
 
     # I _think_ this check is all that's needed and the 3 "hasattr" checks
     # below can be removed, but it's not clear how to verify that
+    import django.template
     from django.apps import apps
     if not apps.ready:
         return False
@@ -93,6 +144,9 @@ def check_debug():
                 "Template debugging must be enabled in settings."
             )
 
+    from django.core.signals import setting_changed
+    setting_changed.connect(_forget_debug_check)
+    _debug_checked = True
     return True
 
 
@@ -109,6 +163,13 @@ def filename_for_frame(frame):
         return None
 
 
+def filename_for_node(node):
+    try:
+        return node.origin.name
+    except AttributeError:
+        return None
+
+
 def position_for_node(node):
     try:
         return node.token.position
@@ -120,6 +181,46 @@ def position_for_token(token):
     return token.position
 
 
+def module_source_file(modname):
+    """Find the source file of module `modname`, without importing it.
+
+    Only the top-level package is located with the import system, so that
+    nothing gets imported before settings are ready.  Returns None if the
+    module can't be found.
+
+    """
+    top, _, rest = modname.partition(".")
+    spec = importlib.util.find_spec(top)
+    if spec is None:
+        return None
+    if not rest:
+        return spec.origin
+    for location in spec.submodule_search_locations or ():
+        base = os.path.join(location, *rest.split("."))
+        for candidate in [base + ".py", os.path.join(base, "__init__.py")]:
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def template_patterns(text):
+    """Parse a list of file name patterns, separated by commas or newlines.
+
+    Patterns that don't start with a wildcard are relative to the current
+    directory, as in coverage.py's include and omit options.
+
+    """
+    patterns = []
+    for pattern in re.split(r"[,\n]", text):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if not pattern.startswith(("*", "?")):
+            pattern = os.path.abspath(pattern)
+        patterns.append(pattern)
+    return patterns
+
+
 def read_template_source(filename):
     """Read the source of a Django template, returning the Unicode text."""
     # Import this late to be sure we don't trigger settings machinery too
@@ -141,6 +242,24 @@ def read_template_source(filename):
     return text
 
 
+# The options that turn on render probes, and the module and class of each.
+# The option's value is the file the probe's data is saved to.
+PROBE_OPTIONS = {
+    "hit_counts": ("hitcount", "HitCounter"),
+    "render_times": ("rendertime", "RenderTimer"),
+    "query_counts": ("queries", "QueryCounter"),
+    "loop_queries": ("loopqueries", "LoopQueryDetector"),
+    "cache_stats": ("fragmentcache", "CacheProbe"),
+    "allocations": ("allocation", "AllocationProbe"),
+    "load_times": ("loading", "LoadProbe"),
+    "expression_times": ("expressions", "ExpressionProbe"),
+    "render_stacks": ("flamegraph", "StackProbe"),
+}
+
+# The plugins made in this process, for prefork.warm_up to find.
+plugin_instances = weakref.WeakSet()
+
+
 class DjangoTemplatePlugin(
     coverage.plugin.CoveragePlugin,
     coverage.plugin.FileTracer,
@@ -150,41 +269,200 @@ class DjangoTemplatePlugin(
         extensions = options.get("template_extensions", "html,htm,txt")
         self.extensions = [e.strip() for e in extensions.split(",")]
 
-        self.debug_checked = False
+        self.html_report_dir = None
+
+        self.line_index_file = options.get("line_index")
+        self.line_index = None
+
+        plugin_instances.add(self)
 
+        # Find django.template without importing it.
         self.django_template_dir = os.path.normcase(os.path.realpath(
-            os.path.dirname(django.template.__file__)
+            os.path.dirname(importlib.util.find_spec("django.template").origin)
         ))
 
+        # Tag library modules whose Node render methods should be traced too.
+        self.tag_library_files = set()
+        for modname in options.get("tag_libraries", "").split(","):
+            modname = modname.strip()
+            if not modname:
+                continue
+            modfile = module_source_file(modname)
+            if modfile is None:
+                raise DjangoTemplatePluginException(
+                    f"Couldn't find tag library module {modname!r}"
+                )
+            self.tag_library_files.add(os.path.normcase(os.path.realpath(modfile)))
+
+        # Which templates to measure, checked once for each template.
+        self.template_include = template_patterns(options.get("template_include", ""))
+        self.template_omit = template_patterns(options.get("template_omit", ""))
+        # Maps template file names to whether they are measured.
+        self.template_choices = {}
+
         self.source_map = {}
+        # Line maps shared with other processes, if configured.
+        self.line_map_store_file = options.get("line_map_store")
+        self.line_map_store = None
+        # The file reporters we've made, to account for their memory.  They
+        # aren't hashable, so they are keyed by id.
+        self.file_reporters = weakref.WeakValueDictionary()
+
+        # Counts of what the tracing methods do, to diagnose overhead.  They
+        # are shown in the sys info, and at exit with "[run] debug = sys".
+        self.counters = collections.Counter()
+        # Counts of (-1, -1) results from line_number_range, by node type.
+        self.no_line_nodes = collections.Counter()
+
+        # Latency histograms of the callbacks, if asked for.  The timed methods
+        # are replaced on this instance, so there's no cost if they aren't.
+        # The tracing callbacks are also charged to their templates.
+        # get_line_map is called by line_number_range, so isn't charged again.
+        self.timings = None
+        timings_file = options.get("timings")
+        if timings_file:
+            from .timing import Timings
+            self.timings = Timings()
+            self.dynamic_source_filename = self.timings.timed(
+                "dynamic_source_filename", self.dynamic_source_filename,
+                template_of=lambda args, filename: filename,
+            )
+            self.line_number_range = self.timings.timed(
+                "line_number_range", self.line_number_range,
+                template_of=lambda args, lines: filename_for_frame(args[0]),
+            )
+            self.get_line_map = self.timings.timed("get_line_map", self.get_line_map)
+            atexit.register(self.timings.save, timings_file)
+
+        # A log of the line_number_range results, if asked for.
+        self.trace_log = None
+        trace_log_file = options.get("trace_log")
+        if trace_log_file:
+            from .tracelog import TraceLog
+            trace_log_size = options.get("trace_log_size", 100000)
+            try:
+                trace_log_size = int(trace_log_size)
+            except ValueError:
+                trace_log_size = 0
+            if trace_log_size < 1:
+                raise DjangoTemplatePluginException(
+                    f"trace_log_size must be a positive integer, not {options['trace_log_size']!r}"
+                )
+            self.trace_log = TraceLog(trace_log_size)
+            self.line_number_range = self._logged(self.line_number_range)
+            atexit.register(self.trace_log.save, trace_log_file)
+
+        # Probes that watch every template node render, for profiling.  The
+        # render hooks are only installed if a probe is asked for, when the
+        # first template is traced.
+        self.render_hooks = None
+        for option, (module_name, class_name) in PROBE_OPTIONS.items():
+            probe_file = options.get(option)
+            if probe_file:
+                module = importlib.import_module(f".{module_name}", __package__)
+                probe = getattr(module, class_name)()
+                self.add_probe(probe)
+                atexit.register(probe.save, probe_file)
+
+        memory_report_file = options.get("memory_report")
+        if memory_report_file:
+            atexit.register(self.write_memory_report, memory_report_file)
+
+        # Recording the renders needs django.test, so the recorder is started
+        # when the first template is traced, like the render hooks.
+        self.workload_recorder = None
+        record_workload = options.get("record_workload")
+        if record_workload:
+            from .workload import WorkloadRecorder
+            self.workload_recorder = WorkloadRecorder()
+            atexit.register(self.workload_recorder.save, record_workload)
 
     # --- CoveragePlugin methods
 
     def sys_info(self):
         return [
             ("django_template_dir", self.django_template_dir),
+            ("tag_library_files", sorted(self.tag_library_files)),
+            ("template_include", self.template_include),
+            ("template_omit", self.template_omit),
             ("environment", sorted(
                 ("{} = {}".format(k, v))
                 for k, v in os.environ.items()
                 if "DJANGO" in k
             )),
+            ("counters", [
+                f"{name} = {count}" for name, count in sorted(self.counters.items())
+            ]),
+            ("no_line_nodes", [
+                f"{name} = {count}" for name, count in self.no_line_nodes.most_common()
+            ]),
+            ("cache_bytes", sum(size for _, _, size in memory_usage(self))),
         ]
 
+    def add_probe(self, probe):
+        """Run `probe` as each template node renders, once templates are traced."""
+        if self.render_hooks is None:
+            from .probes import RenderHooks
+            self.render_hooks = RenderHooks(self)
+        self.render_hooks.add(probe)
+
+    def write_memory_report(self, filename=None):
+        """Write a report of the memory in the plugin's caches.
+
+        The report goes to `filename`, or to stderr if it's None.
+
+        """
+        lines = memory_report(memory_usage(self))
+        if filename is None:
+            sys.stderr.write("".join(line + "\n" for line in lines))
+        else:
+            with open(filename, "w") as f:
+                f.write("".join(line + "\n" for line in lines))
+
     def configure(self, config):
         self.html_report_dir = os.path.abspath(config.get_option("html:directory"))
+        if self.line_map_store_file:
+            # The store goes with the coverage data files.
+            data_dir = os.path.dirname(os.path.abspath(config.get_option("run:data_file")))
+            self.line_map_store_file = os.path.join(data_dir, self.line_map_store_file)
+        if "sys" in (config.get_option("run:debug") or ()):
+            # The sys info is written when coverage starts, before anything
+            # has been counted.  Write the counters again at the end.
+            atexit.register(self.write_counters)
+
+    def write_counters(self, write=None):
+        """Write the tracing counters, formatted like coverage's sys info."""
+        from coverage.debug import write_formatted_info
+
+        if write is None:
+            def write(line):
+                sys.stderr.write(line + "\n")
+
+        info = [
+            item for item in self.sys_info()
+            if item[0] in ("counters", "no_line_nodes", "cache_bytes")
+        ]
+        write_formatted_info(write, "sys: django_coverage_plugin counters", info)
 
     def file_tracer(self, filename):
-        if os.path.normcase(filename).startswith(self.django_template_dir):
-            if not self.debug_checked:
-                # Keep calling check_debug until it returns True, which it
-                # will only do after settings have been configured
-                self.debug_checked = check_debug()
-
+        filename = os.path.normcase(filename)
+        if filename.startswith(self.django_template_dir) or filename in self.tag_library_files:
+            # Until settings have been configured, check_debug returns False
+            # and we'll try again with the next file.  After it has returned
+            # True once, it's remembered until TEMPLATES changes.
+            check_debug()
+            self.counters["file_tracer_claims"] += 1
             return self
         return None
 
     def file_reporter(self, filename):
-        return FileReporter(filename)
+        if self.line_index_file and self.line_index is None:
+            self.line_index = LineIndex.read(self.line_index_file)
+        reporter = FileReporter(filename, line_index=self.line_index)
+        self.file_reporters[id(reporter)] = reporter
+        if self.timings is not None:
+            reporter.lines = self.timings.timed("FileReporter.lines", reporter.lines)
+        return reporter
 
     def find_executable_files(self, src_dir):
         # We're only interested in files that look like reasonable HTML
@@ -198,7 +476,9 @@ class DjangoTemplatePlugin(
                 continue
             for filename in filenames:
                 if re.search(rx, filename):
-                    yield os.path.join(dirpath, filename)
+                    path = os.path.join(dirpath, filename)
+                    if self.is_measured(os.path.abspath(path)):
+                        yield path
 
     # --- FileTracer methods
 
@@ -210,7 +490,9 @@ class DjangoTemplatePlugin(
     RENDER_METHODS = {"render", "render_annotated"}
 
     def dynamic_source_filename(self, filename, frame):
+        self.counters["dynamic_source_filename_calls"] += 1
         if frame.f_code.co_name not in self.RENDER_METHODS:
+            self.counters["dynamic_source_filename_rejections"] += 1
             return None
 
         if 0:
@@ -220,30 +502,65 @@ class DjangoTemplatePlugin(
             if filename.startswith("<"):
                 # String templates have a filename of "<unknown source>", and
                 # can't be reported on later, so ignore them.
+                self.counters["dynamic_source_filename_rejections"] += 1
+                return None
+            if not self.template_measured(filename):
+                self.counters["dynamic_source_filename_rejections"] += 1
                 return None
+            if Lexer is None:
+                load_django_template()
+            if self.render_hooks is not None and not self.render_hooks.installed:
+                self.render_hooks.install()
+            if self.workload_recorder is not None and not self.workload_recorder.started:
+                self.workload_recorder.start()
             return filename
+        self.counters["dynamic_source_filename_rejections"] += 1
         return None
 
+    def template_measured(self, filename):
+        """Is template `filename` measured?  The answer is kept in template_choices."""
+        measured = self.template_choices.get(filename)
+        if measured is None:
+            measured = self.template_choices[filename] = self.is_measured(filename)
+        return measured
+
+    def is_measured(self, filename):
+        """Should template `filename` be measured, by template_include and template_omit?"""
+        if self.template_include and not any(
+            fnmatch.fnmatch(filename, pattern) for pattern in self.template_include
+        ):
+            return False
+        return not any(fnmatch.fnmatch(filename, pattern) for pattern in self.template_omit)
+
     def line_number_range(self, frame):
         assert frame.f_code.co_name in self.RENDER_METHODS
         if 0:
             dump_frame(frame, label="line_number_range")
+        self.counters["line_number_range_calls"] += 1
+        return self.node_line_range(frame.f_locals['self'])
+
+    def node_line_range(self, render_self):
+        """The first and last template lines of node `render_self`.
 
-        render_self = frame.f_locals['self']
+        Returns (-1, -1) if the node has no lines of its own.
+
+        """
         if isinstance(render_self, (NodeList, Template)):
+            self.no_line_nodes[type(render_self).__name__] += 1
             return -1, -1
 
         position = position_for_node(render_self)
         if position is None:
+            self.no_line_nodes[type(render_self).__name__] += 1
             return -1, -1
 
-        if SHOW_TRACING:
-            print(f"{render_self!r}: {position}")
         s_start, s_end = position
         if isinstance(render_self, TextNode):
-            first_line = render_self.s.splitlines(True)[0]
-            if first_line.isspace():
-                s_start += len(first_line)
+            # Skip a first line that is only whitespace.  Match just that line,
+            # rather than splitting what could be a very large text node.
+            blank_first_line = BLANK_FIRST_LINE_RE.match(render_self.s)
+            if blank_first_line:
+                s_start += blank_first_line.end()
         elif VerbatimNode and isinstance(render_self, VerbatimNode):
             # VerbatimNode doesn't track source the same way. s_end only points
             # to the end of the {% verbatim %} opening tag, not the entire
@@ -256,20 +573,28 @@ class DjangoTemplatePlugin(
             last_tokens = render_self.plural or render_self.singular
             s_end = position_for_token(last_tokens[-1])[1]
 
-        filename = filename_for_frame(frame)
+        filename = filename_for_node(render_self)
         line_map = self.get_line_map(filename)
         start = get_line_number(line_map, s_start)
         end = get_line_number(line_map, s_end-1)
         if start < 0 or end < 0:
+            self.no_line_nodes[type(render_self).__name__] += 1
             start, end = -1, -1
-        if SHOW_TRACING:
-            print("line_number_range({}) -> {}".format(
-                filename, (start, end)
-            ))
         return start, end
 
     # --- FileTracer helpers
 
+    def _logged(self, line_number_range):
+        """Wrap `line_number_range` to record its results in the trace log."""
+        record = self.trace_log.record
+
+        def _logged_line_number_range(frame):
+            start, end = line_number_range(frame)
+            record(type(frame.f_locals["self"]), filename_for_frame(frame), start, end)
+            return start, end
+
+        return _logged_line_number_range
+
     def get_line_map(self, filename):
         """The line map for `filename`.
 
@@ -282,21 +607,41 @@ class DjangoTemplatePlugin(
         Line 1 always starts at character 0.
 
         """
-        if filename not in self.source_map:
-            template_source = read_template_source(filename)
-            if 0:   # change to see the template text
-                for i in range(0, len(template_source), 10):
-                    print("%3d: %r" % (i, template_source[i:i+10]))
-            self.source_map[filename] = make_line_map(template_source)
+        if filename in self.source_map:
+            self.counters["line_map_hits"] += 1
+        else:
+            self.counters["line_map_misses"] += 1
+            line_map = None
+            if self.line_map_store_file:
+                if self.line_map_store is None:
+                    from .linemapstore import LineMapStore
+                    self.line_map_store = LineMapStore(self.line_map_store_file)
+                stat = os.stat(filename)
+                line_map = self.line_map_store.get(filename, stat)
+                if line_map is not None:
+                    self.counters["line_map_store_hits"] += 1
+            if line_map is None:
+                self.counters["source_bytes_read"] += os.path.getsize(filename)
+                template_source = read_template_source(filename)
+                if 0:   # change to see the template text
+                    for i in range(0, len(template_source), 10):
+                        print("%3d: %r" % (i, template_source[i:i+10]))
+                line_map = make_line_map(template_source)
+                if self.line_map_store is not None:
+                    self.line_map_store.append(filename, stat, line_map)
+            self.source_map[filename] = line_map
         return self.source_map[filename]
 
 
 class FileReporter(coverage.plugin.FileReporter):
-    def __init__(self, filename):
+    def __init__(self, filename, line_index=None):
         super().__init__(filename)
         # TODO: html filenames are absolute.
 
         self._source = None
+        self.line_index = line_index
+
+        load_django_template()
 
     def source(self):
         if self._source is None:
@@ -307,6 +652,11 @@ class FileReporter(coverage.plugin.FileReporter):
         return self._source
 
     def lines(self):
+        if self.line_index is not None:
+            source_lines = self.line_index.lines_for(self.source())
+            if source_lines is not None:
+                return source_lines
+
         source_lines = set()
 
         if SHOW_PARSING:
@@ -389,6 +739,79 @@ class FileReporter(coverage.plugin.FileReporter):
 
         return source_lines
 
+    def source_token_lines(self):
+        # Build one line at a time from the template's tags and text, so that
+        # large templates don't need a list of all their lines.
+        line = []
+        for token_class, text in self._source_tokens():
+            for piece in text.splitlines(True):
+                stripped = piece.splitlines()[0]
+                if stripped:
+                    line.append((token_class, stripped))
+                if stripped != piece:
+                    # The piece ended with a line break.
+                    yield line
+                    line = []
+        if line:
+            yield line
+
+    def _source_tokens(self):
+        """Generate (token class, text) pairs covering the whole source.
+
+        This mirrors what Lexer.tokenize does, but produces the pieces lazily.
+        Tags are "key", variables are "nam", comments are "com", and text is
+        "txt".
+
+        """
+        source = self.source()
+        # Are we inside a {% comment %} block?
+        comment = False
+        # If inside a {% verbatim %} block, the tag that will end it.
+        verbatim = None
+
+        pos = 0
+        for match in tag_re.finditer(source):
+            start, end = match.span()
+            if start > pos:
+                yield ("com" if comment else "txt"), source[pos:start]
+            pos = end
+
+            token = match.group()
+            contents = token[2:-2].strip()
+            if verbatim:
+                if token.startswith("{%") and contents == verbatim:
+                    verbatim = None
+                    yield "key", token
+                else:
+                    yield "txt", token
+            elif token.startswith("{#"):
+                yield "com", token
+            elif comment:
+                if token.startswith("{%") and contents == "endcomment":
+                    comment = False
+                    yield "key", token
+                else:
+                    yield "com", token
+            elif token.startswith("{%"):
+                tag_name = contents.split(" ", 1)[0]
+                if tag_name == "comment":
+                    comment = True
+                elif tag_name == "verbatim":
+                    verbatim = "end" + contents
+                yield "key", token
+            else:
+                yield "nam", token
+
+        if pos < len(source):
+            yield ("com" if comment else "txt"), source[pos:]
+
+
+# The line breaks that str.splitlines recognizes.
+LINE_BREAKS = "\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029"
+
+# A first line of text that is all whitespace, including its line break.
+BLANK_FIRST_LINE_RE = re.compile(rf"[^\S{LINE_BREAKS}]*(\r\n|[{LINE_BREAKS}]|\Z)")
+
 
 def running_sum(seq):
     total = 0
@@ -405,10 +828,12 @@ def make_line_map(text):
 
 def get_line_number(line_map, offset):
     """Find a line number, given a line map and a character offset."""
-    for lineno, line_offset in enumerate(line_map, start=1):
-        if line_offset > offset:
-            return lineno
-    return -1
+    # The line map is sorted, so we can binary search it: the line is the
+    # first one that ends after the offset.
+    lineno = bisect.bisect_right(line_map, offset) + 1
+    if lineno > len(line_map):
+        return -1
+    return lineno
 
 
 def dump_frame(frame, label=""):
@@ -0,0 +1,72 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Warming up the plugin in a server's parent process, before it forks.
+
+Prefork servers like gunicorn fork their workers from a parent process.  If
+coverage is measuring the parent, each worker starts with a copy of the
+plugin, but its caches are empty, so every worker reads and line-maps each
+template again.  Warming up fills the caches in the parent, so the workers
+start with them.
+
+Forked workers share the parent's memory until they write to it.  Python
+writes to an object when its reference count changes, and when the garbage
+collector looks at it.  The warmed-up line maps are arrays, so looking up
+lines doesn't touch reference counts of the offsets, and gc.freeze() moves
+everything the parent has made out of the collector's sight.
+
+"""
+
+import array
+import gc
+import os.path
+
+from . import plugin as plugin_module
+
+
+def django_template_dirs():
+    """The template directories of the configured Django template engines."""
+    from django.template import engines
+    from django.template.backends.django import DjangoTemplates
+
+    dirs = []
+    for engine in engines.all():
+        if isinstance(engine, DjangoTemplates):
+            dirs.extend(str(d) for d in engine.template_dirs)
+    return dirs
+
+
+def warm_up(dirs=None, freeze=True):
+    """Fill the caches of the plugins measuring this process.
+
+    The line maps for all the templates in `dirs`, or in the directories of
+    the Django template engines, are made and packed into arrays.  If
+    `freeze` is true, gc.freeze() is called at the end.  Call this in the
+    parent process, just before the workers are forked.
+
+    Returns the number of line maps made.  Templates that can't be read are
+    skipped.
+
+    """
+    plugins = list(plugin_module.plugin_instances)
+    if not plugins:
+        return 0
+    plugin_module.load_django_template()
+    if dirs is None:
+        dirs = django_template_dirs()
+
+    count = 0
+    for plugin in plugins:
+        for src_dir in dirs:
+            for filename in plugin.find_executable_files(os.path.abspath(src_dir)):
+                try:
+                    line_map = plugin.get_line_map(filename)
+                except (OSError, UnicodeError):
+                    continue
+                plugin.source_map[filename] = array.array("L", line_map)
+                count += 1
+
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return count
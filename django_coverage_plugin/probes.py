@@ -0,0 +1,204 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Hooks into the rendering of template nodes, for profiling.
+
+Coverage measurement only needs to know that a template line ran.  Profiling
+needs to see every node as it renders, so RenderHooks replaces Django's
+Node.render_annotated (and TextNode's, which overrides it) with a wrapper that
+tells each probe when a node starts and finishes rendering.  The original
+methods still run, so coverage measurement is unaffected.
+
+The plugin installs the hooks when it first traces a template, so commands
+like ``coverage report`` that never render anything don't pay for them.
+
+Nodes are located in their templates with the plugin's own node-to-line
+mapping, so probes see the same lines that coverage reports.  Nodes that
+override render_annotated themselves aren't seen.
+
+Templates can render in many threads at once, as under LiveServerTestCase or
+a threaded runserver.  The stack of nodes rendering, and the probes' own
+frames, are kept for each thread.  Probes that replace methods while a
+template renders derive from PatchingProbe, which keeps them replaced while
+any thread is rendering.
+
+"""
+
+import threading
+import weakref
+
+from . import plugin as plugin_module
+
+
+class Probe:
+    """Something that watches template nodes render.
+
+    `where` is a (filename, start line, end line) tuple for the node.  The
+    RenderHooks running the probe is available as `self.hooks`, and its
+    `stack` has the `where` of each node being rendered, innermost last.
+
+    """
+
+    hooks = None
+
+    def __init__(self):
+        # The state of the renders in progress, for each thread.
+        self.local = threading.local()
+
+    @property
+    def frames(self):
+        """A list for this thread's state, like a stack of nodes rendering."""
+        frames = getattr(self.local, "frames", None)
+        if frames is None:
+            frames = self.local.frames = []
+        return frames
+
+    def start(self):
+        """Called when the hooks are installed, before any node renders."""
+
+    def enter(self, node, where, context):
+        """Called when `node` starts rendering."""
+
+    def exit(self, node, where, context):
+        """Called when `node` has finished rendering, even with an exception."""
+
+
+class PatchingProbe(Probe):
+    """A probe that replaces methods while templates are rendering.
+
+    Subclasses return (class, name, replacement) tuples from `patches`.  The
+    methods are replaced when the first thread starts rendering a template,
+    and put back when the last one finishes.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        # The number of threads rendering a template.
+        self.rendering = 0
+        # The (class, name, method) of each method we replaced.
+        self.originals = []
+
+    def patches(self):
+        """A list of (class, name, replacement) for the methods to replace."""
+        raise NotImplementedError
+
+    def enter(self, node, where, context):
+        if len(self.hooks.stack) == 1:
+            with self.lock:
+                self.rendering += 1
+                if self.rendering == 1:
+                    for cls, name, replacement in self.patches():
+                        self.originals.append((cls, name, getattr(cls, name)))
+                        setattr(cls, name, replacement)
+
+    def exit(self, node, where, context):
+        if len(self.hooks.stack) == 1:
+            with self.lock:
+                self.rendering -= 1
+                if self.rendering == 0:
+                    for cls, name, original in self.originals:
+                        setattr(cls, name, original)
+                    self.originals = []
+
+
+class RenderHooks:
+    """Run probes as template nodes render."""
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.probes = []
+        # The stack of each thread rendering.
+        self.local = threading.local()
+        # Maps nodes to their `where`, or None if they have no lines.  Weak,
+        # so that templates compiled for each render can still be freed.
+        self.node_wheres = weakref.WeakKeyDictionary()
+        # Maps classes to the render_annotated methods we replaced.
+        self.originals = {}
+        self.installed = False
+
+    @property
+    def stack(self):
+        """The `where` of each node this thread is rendering, innermost last."""
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def add(self, probe):
+        probe.hooks = self
+        self.probes.append(probe)
+        if self.installed:
+            probe.start()
+
+    def where(self, node):
+        """The (filename, start, end) of `node`, or None if it has no lines."""
+        try:
+            return self.node_wheres[node]
+        except KeyError:
+            pass
+        where = None
+        filename = plugin_module.filename_for_node(node)
+        if (
+            filename is not None and not filename.startswith("<")
+            and self.plugin.template_measured(filename)
+        ):
+            try:
+                start, end = self.plugin.node_line_range(node)
+            except Exception:
+                # Templates that aren't files, like those from the locmem
+                # loader, can't be line-mapped.  The probes mustn't break the
+                # render, so they don't see these nodes.
+                start, end = -1, -1
+            # A text node that's only the end of a line has no lines: it
+            # starts on the next line, after it ends.
+            if 0 <= start <= end:
+                where = (filename, start, end)
+        self.node_wheres[node] = where
+        return where
+
+    def install(self):
+        plugin_module.load_django_template()
+        from django.template.base import Node
+
+        for cls in [Node, plugin_module.TextNode]:
+            if "render_annotated" in cls.__dict__:
+                original = cls.__dict__["render_annotated"]
+                self.originals[cls] = original
+                cls.render_annotated = self._hooked(original)
+        self.installed = True
+        for probe in self.probes:
+            probe.start()
+
+    def uninstall(self):
+        for cls, original in self.originals.items():
+            cls.render_annotated = original
+        self.originals = {}
+        self.installed = False
+
+    def _hooked(self, original):
+        """Make a render_annotated that runs the probes around `original`."""
+        hooks = self
+        probes = self.probes
+        where_for = self.where
+
+        def render_annotated(node, context):
+            where = where_for(node)
+            if where is None:
+                return original(node, context)
+            stack = hooks.stack
+            stack.append(where)
+            # Only the probes that entered the node are told it exited.
+            entered = 0
+            try:
+                for probe in probes:
+                    probe.enter(node, where, context)
+                    entered += 1
+                return original(node, context)
+            finally:
+                for probe in reversed(probes[:entered]):
+                    probe.exit(node, where, context)
+                stack.pop()
+
+        return render_annotated
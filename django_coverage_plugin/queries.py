@@ -0,0 +1,103 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Database queries charged to the template lines that ran them.
+
+Lazy querysets are often evaluated inside templates, where Python profiles
+can't see which line did it.  The query counter is a render probe that puts
+an execute wrapper on every database connection while a template renders,
+and charges each query, and its time, to the innermost node rendering.
+
+"""
+
+import contextlib
+import time
+
+from .parallel import LineStats, source_line
+from .probes import Probe
+
+
+class QueryCounts(LineStats):
+    """Queries run by template lines: [queries, ns]."""
+
+    WIDTH = 2
+    DESCRIPTION = "query counts"
+
+    def rows(self, sort="queries"):
+        """A list of (filename, line, queries, ns).
+
+        Sorted by `sort`: "queries" or "time", biggest first.
+
+        """
+        return super().rows(["queries", "time"].index(sort))
+
+
+class QueryProbe(Probe):
+    """A render probe that sees the database queries run while rendering.
+
+    Subclasses implement `query` to be told of each query.
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.clock = time.perf_counter_ns
+
+    def enter(self, node, where, context):
+        if len(self.hooks.stack) == 1:
+            from django.db import connections
+
+            # Connections are per thread, and so are the execute wrappers.
+            wrapping = self.local.wrapping = contextlib.ExitStack()
+            for connection in connections.all():
+                wrapping.enter_context(connection.execute_wrapper(self.execute))
+
+    def exit(self, node, where, context):
+        if len(self.hooks.stack) == 1:
+            wrapping = getattr(self.local, "wrapping", None)
+            if wrapping is not None:
+                wrapping.close()
+                self.local.wrapping = None
+
+    def execute(self, execute, sql, params, many, context):
+        """An execute wrapper, as in connection.execute_wrapper()."""
+        start = self.clock()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query(sql, self.clock() - start)
+
+    def query(self, sql, ns):
+        """Called for each query run while rendering, with its duration."""
+
+
+class QueryCounter(QueryProbe):
+    """A render probe counting the queries run by each template line."""
+
+    def __init__(self):
+        super().__init__()
+        self.counts = QueryCounts()
+
+    def query(self, sql, ns):
+        stack = self.hooks.stack
+        if stack:
+            filename, lineno, _ = stack[-1]
+            stats = self.counts.stats_for(filename, lineno)
+            stats[0] += 1
+            stats[1] += ns
+
+    def save(self, filename):
+        self.counts.save(filename)
+
+
+def query_report(counts, outfile, sort="queries", top=None):
+    """Write a report of QueryCounts `counts` to the open file `outfile`.
+
+    The `top` lines by `sort` are shown, or all of them, with their source.
+
+    """
+    sources = {}
+    outfile.write(f"{'queries':>10} {'ms':>10}  line\n")
+    for filename, lineno, queries, ns in counts.rows(sort)[:top]:
+        text = source_line(filename, lineno, sources)
+        outfile.write(f"{queries:10} {ns / 1e6:10.3f}  {filename}:{lineno}  {text[:60]}\n")
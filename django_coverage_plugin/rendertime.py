@@ -0,0 +1,81 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""A profiler of the time spent rendering each template line.
+
+The render timer is a render probe that times every node from the start of
+its render to the end.  The time is charged to the line the node starts on,
+both inclusive, with the nodes rendered inside it, and exclusive, without
+them.  A line that renders inside itself, like a recursive include, has its
+inclusive time counted at each level.
+
+"""
+
+import time
+
+from .parallel import LineStats, source_line
+from .probes import Probe
+
+
+class RenderTimes(LineStats):
+    """Render times for template lines: [calls, inclusive_ns, exclusive_ns]."""
+
+    WIDTH = 3
+    DESCRIPTION = "render times"
+
+    def rows(self, sort="exclusive"):
+        """A list of (filename, line, calls, inclusive_ns, exclusive_ns).
+
+        Sorted by `sort`: "exclusive", "inclusive", or "calls", biggest first.
+
+        """
+        return super().rows(["calls", "inclusive", "exclusive"].index(sort))
+
+
+class RenderTimer(Probe):
+    """A render probe timing the renders of each template line."""
+
+    def __init__(self):
+        super().__init__()
+        self.times = RenderTimes()
+        # The frames are [start_ns, ns spent in its children] for each node
+        # being rendered.
+        self.clock = time.perf_counter_ns
+
+    def enter(self, node, where, context):
+        self.frames.append([self.clock(), 0])
+
+    def exit(self, node, where, context):
+        elapsed = self.clock()
+        frames = self.frames
+        start, child_ns = frames.pop()
+        elapsed -= start
+        if frames:
+            frames[-1][1] += elapsed
+        stats = self.times.stats_for(where[0], where[1])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += elapsed - child_ns
+
+    def save(self, filename):
+        self.times.save(filename)
+
+
+def render_time_report(times, outfile, sort="exclusive", top=None):
+    """Write a report of RenderTimes `times` to the open file `outfile`.
+
+    The `top` lines by `sort` are shown, or all of them, with their source.
+
+    """
+    rows = times.rows(sort)[:top]
+    total_ns = sum(row[4] for row in times.rows()) or 1
+    sources = {}
+    outfile.write(
+        f"{'calls':>10} {'incl ms':>10} {'excl ms':>10} {'excl %':>7}  line\n"
+    )
+    for filename, lineno, calls, inclusive_ns, exclusive_ns in rows:
+        text = source_line(filename, lineno, sources)
+        outfile.write(
+            f"{calls:10} {inclusive_ns / 1e6:10.3f} {exclusive_ns / 1e6:10.3f} "
+            f"{exclusive_ns / total_ns:7.1%}  {filename}:{lineno}  {text[:60]}\n"
+        )
@@ -0,0 +1,185 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Latency histograms for the plugin's callbacks.
+
+When timing is enabled, the plugin's callbacks are wrapped to record how long
+each call takes.  Durations go into fixed power-of-two buckets, so recording
+one is a few integer operations.  Each process writes its histograms to its
+own file at exit, and the files can be combined, like coverage's own parallel
+data files.
+
+The time spent in callbacks for a template frame is also totaled by template,
+to show which templates cost the most to trace.
+
+"""
+
+import functools
+import time
+
+from .parallel import DataFile
+
+# Bucket i counts durations of less than 2**i nanoseconds, and at least
+# 2**(i-1).  The last bucket also counts everything longer.
+NUM_BUCKETS = 32
+
+
+def bucket_bound_ns(index):
+    """The upper bound of bucket `index`, in nanoseconds."""
+    return 2 ** index
+
+
+class Histogram:
+    """The distribution of durations for one callback."""
+
+    __slots__ = ["counts", "total_ns"]
+
+    def __init__(self, counts=None, total_ns=0):
+        self.counts = counts or [0] * NUM_BUCKETS
+        self.total_ns = total_ns
+
+    def record(self, ns):
+        index = ns.bit_length()
+        if index >= NUM_BUCKETS:
+            index = NUM_BUCKETS - 1
+        self.counts[index] += 1
+        self.total_ns += ns
+
+    def count(self):
+        return sum(self.counts)
+
+    def update(self, other):
+        """Add the durations from Histogram `other` into this one."""
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total_ns += other.total_ns
+
+    def percentile(self, pct):
+        """An upper bound on the `pct` percentile duration, in nanoseconds."""
+        wanted = self.count() * pct / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= wanted:
+                return bucket_bound_ns(index)
+        return 0
+
+
+class Timings(DataFile):
+    """A set of named histograms, and the time spent on each template."""
+
+    DESCRIPTION = "timings"
+
+    def __init__(self, histograms=None, templates=None):
+        self.histograms = histograms or {}
+        # Maps template filenames to [calls, total_ns].
+        self.templates = templates or {}
+
+    def timed(self, name, func, template_of=None):
+        """Wrap `func` so that its calls are recorded in histogram `name`.
+
+        If `template_of` is provided, it's called with the arguments and result
+        of `func`, and returns the template filename to charge the call to, or
+        None.
+
+        """
+        histogram = self.histograms.setdefault(name, Histogram())
+        templates = self.templates
+        clock = time.perf_counter_ns
+
+        @functools.wraps(func)
+        def _timed(*args):
+            start = clock()
+            try:
+                result = func(*args)
+            finally:
+                elapsed = clock() - start
+                histogram.record(elapsed)
+            if template_of is not None:
+                template = template_of(args, result)
+                if template is not None:
+                    totals = templates.get(template)
+                    if totals is None:
+                        totals = templates[template] = [0, 0]
+                    totals[0] += 1
+                    totals[1] += elapsed
+            return result
+
+        return _timed
+
+    def update(self, other):
+        """Add the histograms and template totals from Timings `other` into these."""
+        for name, histogram in other.histograms.items():
+            self.histograms.setdefault(name, Histogram()).update(histogram)
+        for template, (calls, total_ns) in other.templates.items():
+            totals = self.templates.setdefault(template, [0, 0])
+            totals[0] += calls
+            totals[1] += total_ns
+
+    def is_empty(self):
+        return not any(histogram.count() for histogram in self.histograms.values())
+
+    def to_json(self):
+        return {
+            "histograms": {
+                name: {"counts": hist.counts, "total_ns": hist.total_ns}
+                for name, hist in self.histograms.items()
+            },
+            "templates": {
+                template: {"calls": calls, "total_ns": total_ns}
+                for template, (calls, total_ns) in self.templates.items()
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            {
+                name: Histogram(hist["counts"], hist["total_ns"])
+                for name, hist in data["histograms"].items()
+            },
+            {
+                template: [totals["calls"], totals["total_ns"]]
+                for template, totals in data["templates"].items()
+            },
+        )
+
+    def summary(self):
+        """Lines of text summarizing the histograms."""
+        lines = [
+            f"{'callback':26} {'calls':>10} {'total ms':>10} {'mean us':>9} "
+            f"{'p50 us':>9} {'p99 us':>9}"
+        ]
+        for name, hist in sorted(self.histograms.items()):
+            count = hist.count()
+            mean = hist.total_ns / count if count else 0
+            lines.append(
+                f"{name:26} {count:10} {hist.total_ns / 1e6:10.1f} {mean / 1e3:9.2f} "
+                f"{hist.percentile(50) / 1e3:9.2f} {hist.percentile(99) / 1e3:9.2f}"
+            )
+        return lines
+
+    def top_templates(self, n=None, sort="time"):
+        """The `n` templates that took the longest to trace.
+
+        Returns a list of (filename, calls, total_ns) tuples, sorted by
+        `sort`, either "time" or "calls".
+
+        """
+        key = 2 if sort == "time" else 1
+        rows = sorted(
+            ((template, calls, total_ns) for template, (calls, total_ns) in self.templates.items()),
+            key=lambda row: (-row[key], row[0]),
+        )
+        return rows[:n]
+
+    def template_summary(self, n=None, sort="time"):
+        """Lines of text for the `n` templates that took the longest to trace."""
+        rows = self.top_templates(n, sort)
+        total_ns = sum(totals[1] for totals in self.templates.values()) or 1
+        lines = [f"{'calls':>10} {'total ms':>10} {'share':>6}  template"]
+        for template, calls, template_ns in rows:
+            lines.append(
+                f"{calls:10} {template_ns / 1e6:10.1f} {template_ns / total_ns:6.1%}  {template}"
+            )
+        return lines
@@ -0,0 +1,129 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""A compact log of the plugin's tracing events.
+
+Each line_number_range call is recorded as four integers: the node type, the
+template file, and the start and end lines returned.  Node types and files are
+numbered as they are first seen.  Records go into a preallocated ring buffer,
+so a long run keeps only the most recent events, and recording one doesn't
+build any strings.
+
+The log file is a magic line, a JSON header with the names of the node types
+and files, and then the records as raw 32-bit integers.  Each process writes
+its own log, named from the configured one by `process_filename`.
+
+"""
+
+import array
+import glob
+import json
+import os.path
+import struct
+import sys
+
+from .parallel import data_error, process_filename
+
+TRACE_LOG_MAGIC = b"django_coverage_plugin trace log\n"
+TRACE_LOG_VERSION = 1
+
+# The number of integers in each record.
+RECORD_INTS = 4
+
+
+class TraceLog:
+    """A ring buffer of (node type, file, start, end) records."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.records = array.array("i", bytes(4 * RECORD_INTS * capacity))
+        # The number of events recorded, including ones overwritten.
+        self.total = 0
+        # Maps node types and filenames to their ids.
+        self.node_types = {}
+        self.files = {}
+
+    def record(self, node_type, filename, start, end):
+        type_id = self.node_types.get(node_type)
+        if type_id is None:
+            type_id = self.node_types[node_type] = len(self.node_types)
+        file_id = self.files.get(filename)
+        if file_id is None:
+            file_id = self.files[filename] = len(self.files)
+        i = (self.total % self.capacity) * RECORD_INTS
+        records = self.records
+        records[i] = type_id
+        records[i+1] = file_id
+        records[i+2] = start
+        records[i+3] = end
+        self.total += 1
+
+    def ordered_records(self):
+        """The records held, oldest first, as an array of integers."""
+        if self.total <= self.capacity:
+            return self.records[:self.total * RECORD_INTS]
+        split = (self.total % self.capacity) * RECORD_INTS
+        return self.records[split:] + self.records[:split]
+
+    def save(self, filename):
+        """Write this process's log, named from `filename`, if anything was traced."""
+        if self.total:
+            self.write(process_filename(filename))
+
+    def write(self, filename):
+        header = {
+            "version": TRACE_LOG_VERSION,
+            "byteorder": sys.byteorder,
+            "capacity": self.capacity,
+            "total": self.total,
+            "node_types": [node_type.__name__ for node_type in self.node_types],
+            "files": list(self.files),
+        }
+        header_bytes = json.dumps(header).encode("utf-8")
+        with open(filename, "wb") as f:
+            f.write(TRACE_LOG_MAGIC)
+            f.write(struct.pack("<I", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(self.ordered_records().tobytes())
+
+
+def trace_log_files(filename):
+    """The trace logs written for `filename`, by any process."""
+    parts = sorted(glob.glob(glob.escape(filename) + ".*"))
+    if os.path.exists(filename):
+        parts.insert(0, filename)
+    if not parts:
+        raise data_error(f"No trace logs for {filename}")
+    return parts
+
+
+def read_trace_log(filename):
+    """Read a trace log written by TraceLog.write.
+
+    Returns the header dict, and a list of (node type, filename, start, end)
+    tuples, oldest first.
+
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_LOG_MAGIC):
+        raise data_error(f"{filename} isn't a trace log")
+    pos = len(TRACE_LOG_MAGIC)
+    (header_len,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    header = json.loads(data[pos:pos+header_len].decode("utf-8"))
+    if header.get("version") != TRACE_LOG_VERSION:
+        raise data_error(
+            f"Trace log {filename} has an unsupported version: {header.get('version')!r}"
+        )
+    ints = array.array("i")
+    ints.frombytes(data[pos+header_len:])
+    if header["byteorder"] != sys.byteorder:
+        ints.byteswap()
+
+    node_types, files = header["node_types"], header["files"]
+    records = [
+        (node_types[ints[i]], files[ints[i+1]], ints[i+2], ints[i+3])
+        for i in range(0, len(ints), RECORD_INTS)
+    ]
+    return header, records
@@ -0,0 +1,199 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Record the templates rendered by a test run, so they can be replayed.
+
+A recorded workload has the name of each template rendered, a snapshot of
+the context it was rendered with, and enough of the engine configuration to
+render it again.  Replaying it needs the templates and their tag libraries,
+but not the rest of the application.
+
+Recording uses Django's `template_rendered` test signal, so it only sees
+renders in a test environment, as set up by Django's test runner or
+pytest-django.  Each process writes its own file, like the other data files,
+and loading a workload reads them all.
+
+"""
+
+import glob
+import os.path
+import pickle
+
+from .parallel import process_filename
+from .plugin import DjangoTemplatePluginException
+
+WORKLOAD_VERSION = 1
+
+
+def picklable_snapshot(values):
+    """Pickle the entries of dict `values` that can be pickled.
+
+    Returns a dict mapping names to pickled values, so that the snapshot is
+    of the values as they are now, not as they are when the workload is
+    saved.  QuerySets that haven't been evaluated are left out, since
+    pickling them would run their queries.
+
+    """
+    from django.db.models.query import QuerySet
+
+    snapshot = {}
+    for name, value in values.items():
+        if isinstance(value, QuerySet) and value._result_cache is None:
+            continue
+        try:
+            snapshot[name] = pickle.dumps(value)
+        except Exception:
+            continue
+    return snapshot
+
+
+def unpickle_snapshot(snapshot):
+    """The values in a snapshot made by picklable_snapshot."""
+    return {name: pickle.loads(pickled) for name, pickled in snapshot.items()}
+
+
+def template_root(origin):
+    """The directory a template was loaded from, or None if it wasn't a file."""
+    name, template_name = origin.name, origin.template_name
+    if not template_name or name.startswith("<") or not name.endswith(template_name):
+        return None
+    return name[:-len(template_name)]
+
+
+class WorkloadRecorder:
+    """Record the top-level template renders in a test run."""
+
+    def __init__(self):
+        self.engines = []
+        self.renders = []
+        # Maps engine ids to their index in self.engines.
+        self._engine_index = {}
+        self.started = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        from django.test.signals import template_rendered
+        template_rendered.connect(self._template_rendered)
+        self.started = True
+
+    def stop(self):
+        from django.test.signals import template_rendered
+        template_rendered.disconnect(self._template_rendered)
+        self.started = False
+
+    def _template_rendered(self, sender, template, context, **kwargs):
+        # Included and extended templates are rendered as part of their
+        # top-level template, and will be replayed as part of it.
+        if context.template is not template:
+            return
+        root = template_root(template.origin)
+        if root is None:
+            return
+        engine = self._engine_config(template.engine)
+        if root not in engine["dirs"]:
+            engine["dirs"].append(root)
+        self.renders.append((
+            self._engine_index[id(template.engine)],
+            template.origin.template_name,
+            picklable_snapshot(context.flatten()),
+        ))
+
+    def _engine_config(self, engine):
+        """The recorded configuration for `engine`."""
+        index = self._engine_index.get(id(engine))
+        if index is None:
+            from django.template.engine import Engine
+
+            index = self._engine_index[id(engine)] = len(self.engines)
+            self.engines.append({
+                "dirs": [],
+                "libraries": dict(engine.libraries),
+                "builtins": [b for b in engine.builtins if b not in Engine.default_builtins],
+                "string_if_invalid": engine.string_if_invalid,
+                "autoescape": engine.autoescape,
+            })
+        return self.engines[index]
+
+    def save(self, filename):
+        """Write to a file for this process, named from `filename`.
+
+        Nothing is written if nothing was rendered, so that processes like
+        ``coverage report`` don't leave empty workloads.
+
+        """
+        if not self.renders:
+            return
+        data = {
+            "version": WORKLOAD_VERSION,
+            "engines": self.engines,
+            "renders": self.renders,
+        }
+        with open(process_filename(filename), "wb") as f:
+            pickle.dump(data, f)
+
+
+class Workload:
+    """A recorded workload, ready to replay."""
+
+    def __init__(self, engines, renders):
+        self.engine_configs = engines
+        self.renders = renders
+        self._templates = None
+
+    @classmethod
+    def load(cls, filename):
+        """Load the workload in `filename` and its per-process files."""
+        parts = sorted(glob.glob(glob.escape(filename) + ".*"))
+        if os.path.exists(filename):
+            parts.insert(0, filename)
+        if not parts:
+            raise DjangoTemplatePluginException(f"No workload files for {filename}")
+        engines, renders = [], []
+        for part in parts:
+            with open(part, "rb") as f:
+                data = pickle.load(f)
+            if data.get("version") != WORKLOAD_VERSION:
+                raise DjangoTemplatePluginException(
+                    f"Workload {part} has an unsupported version: {data.get('version')!r}"
+                )
+            # Each file numbers its own engines.  The same engine in
+            # different processes is only made once.
+            engine_indexes = []
+            for config in data["engines"]:
+                if config not in engines:
+                    engines.append(config)
+                engine_indexes.append(engines.index(config))
+            renders.extend(
+                (engine_indexes[engine_index], template_name, snapshot)
+                for engine_index, template_name, snapshot in data["renders"]
+            )
+        return cls(engines, renders)
+
+    def templates(self):
+        """Compile the templates, returning a list of (template, context) pairs."""
+        if self._templates is None:
+            from django.template.engine import Engine
+
+            engines = [Engine(debug=True, **config) for config in self.engine_configs]
+            compiled = {}
+            self._templates = []
+            for engine_index, template_name, snapshot in self.renders:
+                key = (engine_index, template_name)
+                if key not in compiled:
+                    compiled[key] = engines[engine_index].get_template(template_name)
+                self._templates.append((compiled[key], unpickle_snapshot(snapshot)))
+        return self._templates
+
+    def replay(self):
+        """Render every template in the workload once."""
+        from django.template import Context
+
+        for template, context in self.templates():
+            # Copy the context, so that one replay can't change the next.
+            template.render(Context(dict(context), autoescape=template.engine.autoescape))
@@ -0,0 +1,102 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Generate synthetic corpora of templates, for scaling tests and benchmarks.
+
+Each generator returns a dict mapping template names to their text, with the
+top-level template named "main.html".  The templates render with the context
+from `corpus_context`.
+
+"""
+
+import os
+import os.path
+
+# A mix of the common kinds of template lines.
+LINE_KINDS = [
+    "Some plain text for line {n}.\n",
+    "<p>{{{{ name }}}} is on line {n}</p>\n",
+    "{{% if flag %}}Flag on line {n}{{% endif %}}\n",
+    "{{% for item in items %}}{{{{ item }}}},{{% endfor %}}\n",
+    "{{# a comment on line {n} #}}\n",
+]
+
+
+def corpus_context():
+    """The context to render any corpus with."""
+    return {"name": "Ned", "flag": True, "items": [1, 2, 3]}
+
+
+def long_template(lines):
+    """One template with `lines` lines of mixed tags, variables and text."""
+    text = "".join(LINE_KINDS[n % len(LINE_KINDS)].format(n=n) for n in range(lines))
+    return {"main.html": text}
+
+
+def extends_chain(depth, blocks=5):
+    """A chain of `depth` templates, each extending the next.
+
+    Every level overrides all `blocks` blocks, and uses block.super.
+
+    """
+    files = {}
+    for level in range(depth):
+        name = "main.html" if level == 0 else f"level{level}.html"
+        if level < depth - 1:
+            text = f"{{% extends 'level{level+1}.html' %}}\n"
+        else:
+            text = ""
+        for b in range(blocks):
+            text += (
+                f"{{% block b{b} %}}Level {level} block {b}\n"
+                "{{ block.super }}{% endblock %}\n"
+            )
+        files[name] = text
+    return files
+
+
+def many_includes(count):
+    """A template including `count` different small templates."""
+    files = {
+        f"inc/part{i}.html": f"Part {i}: {{{{ name }}}}\n"
+        for i in range(count)
+    }
+    files["main.html"] = "".join(f"{{% include 'inc/part{i}.html' %}}" for i in range(count))
+    return files
+
+
+def big_text(size):
+    """A template that is one text node of about `size` characters."""
+    line = "This is a long line of plain template text, with no tags at all.\n"
+    return {"main.html": "\n" + line * (size // len(line) + 1)}
+
+
+def nested_fors(depth, body_lines=1):
+    """A template with `depth` {% for %} tags nested inside each other.
+
+    Rendering it runs the body len(items) ** depth times, so render deep ones
+    with a short list of items.
+
+    """
+    text = ""
+    for level in range(depth):
+        text += "  " * level + f"{{% for x{level} in items %}}\n"
+    for n in range(body_lines):
+        text += "  " * depth + f"{{{{ x{depth-1} }}}} line {n}\n"
+    for level in reversed(range(depth)):
+        text += "  " * level + "{% endfor %}\n"
+    return {"main.html": text}
+
+
+def write_corpus(files, root):
+    """Write the templates in `files` under the directory `root`.
+
+    Returns the absolute path of "main.html".
+
+    """
+    for name, text in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+    return os.path.abspath(os.path.join(root, "main.html"))
@@ -134,16 +134,23 @@ class DjangoPluginTestCase(StdStreamCapturingMixin, TempDirMixin, TestCase):
         text = tem.render(ctx)
         self.cov.stop()
         self.cov.save()
+        for pl in self.django_plugins():
+            if not pl._coverage_enabled:
+                raise PluginDisabled()
+        return text
+
+    def django_plugins(self):
+        """The DjangoTemplatePlugins of the last run, in configured order.
+
+        The plugin can be configured more than once: the first one traces.
+
+        """
         # Warning! Accessing secret internals!
         if hasattr(self.cov, 'plugins'):
             plugins = self.cov.plugins
         else:
             plugins = self.cov._plugins
-        for pl in plugins:
-            if isinstance(pl, DjangoTemplatePlugin):
-                if not pl._coverage_enabled:
-                    raise PluginDisabled()
-        return text
+        return [pl for pl in plugins if isinstance(pl, DjangoTemplatePlugin)]
 
     def append_config(self, option, value):
         """Append to a configuration option."""
@@ -0,0 +1,104 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of measuring the memory allocated by template lines."""
+
+import io
+import os.path
+import tracemalloc
+
+from django_coverage_plugin.allocation import (
+    AllocationProbe,
+    Allocations,
+    allocation_report,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+MB = 1024 * 1024
+
+
+class Hungry:
+    """Something that uses memory when a template looks at it."""
+
+    def __init__(self):
+        self.held = []
+
+    def temporary(self):
+        return len(bytearray(MB))
+
+    def kept(self):
+        self.held.append(bytearray(MB))
+        return len(self.held)
+
+
+class AllocationTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        if not tracemalloc.is_tracing():
+            self.addCleanup(tracemalloc.stop)
+        self.make_template(name="main.html", text="""\
+            Hello
+            {{ hungry.temporary }}
+            {% for i in "abc" %}
+                {{ hungry.kept }}
+            {% endfor %}
+            """)
+
+    def lines(self, probe):
+        return {
+            lineno: stats
+            for filename, lines in probe.allocations.files.items()
+            for lineno, stats in lines.items()
+            if os.path.basename(filename) == "main.html"
+        }
+
+    def test_allocations(self):
+        probe = AllocationProbe()
+        self.add_probe(probe)
+        self.assertTrue(tracemalloc.is_tracing())
+        get_template("main.html").render({"hungry": Hungry()})
+
+        lines = self.lines(probe)
+        renders, net_bytes, peak_bytes = lines[2]
+        self.assertEqual(renders, 1)
+        self.assertLess(net_bytes, MB / 2)
+        self.assertGreaterEqual(peak_bytes, MB)
+
+        # The loop holds all of the memory its body kept.
+        renders, net_bytes, peak_bytes = lines[4]
+        self.assertEqual(renders, 3)
+        self.assertGreaterEqual(net_bytes, 3 * MB)
+        self.assertLess(peak_bytes, 2 * MB)
+        self.assertGreaterEqual(lines[3][1], 3 * MB)
+        self.assertGreaterEqual(lines[3][2], 3 * MB)
+        self.assertEqual(probe.frames, [])
+
+    def test_combining_keeps_the_highest_peak(self):
+        one = Allocations({"a.html": {1: [1, 100, 500]}})
+        two = Allocations({"a.html": {1: [2, -50, 300]}})
+        one.update(two)
+        self.assertEqual(one.files, {"a.html": {1: [3, 50, 500]}})
+
+    def test_report(self):
+        probe = AllocationProbe()
+        self.add_probe(probe)
+        get_template("main.html").render({"hungry": Hungry()})
+
+        out = io.StringIO()
+        allocation_report(probe.allocations, out, sort="peak", top=2)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertIn('main.html:3  {% for i in "abc" %}', report[1])
+        self.assertEqual(report[1].split()[0], "1")
+
+    def test_allocations_option(self):
+        data_file = self.run_probe_option(
+            "allocations", AllocationProbe, "allocations", "main.html", {"hungry": Hungry()},
+        )
+        self.assertIn("main.html:2  {{ hungry.temporary }}", self.stdout())
+        rows = Allocations.read(data_file).rows()
+        [row] = [row for row in rows if row[1] == 4]
+        self.assertEqual(row[2], 3)
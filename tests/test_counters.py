@@ -0,0 +1,40 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the plugin's tracing counters."""
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class CountersTest(DjangoPluginTestCase):
+
+    def test_counters(self):
+        self.make_template("""\
+            Hello {{ name }}
+            {% for i in items %}{{ i }}{% endfor %}
+            """)
+        self.run_django_coverage(context={"name": "Ned", "items": [1, 2, 3]})
+        plugin = self.django_plugins()[0]
+        counters = plugin.counters
+
+        self.assertGreater(counters["file_tracer_claims"], 0)
+        self.assertGreater(counters["dynamic_source_filename_calls"], 0)
+        self.assertGreater(counters["dynamic_source_filename_rejections"], 0)
+        self.assertGreater(counters["line_number_range_calls"], 0)
+        # The line map is made once, and used for every other node.
+        self.assertEqual(counters["line_map_misses"], 1)
+        self.assertGreater(counters["line_map_hits"], 0)
+        self.assertEqual(counters["source_bytes_read"], len(b"Hello {{ name }}\n") + 40)
+        # Template.render has no line of its own.
+        self.assertGreater(plugin.no_line_nodes["Template"], 0)
+
+        info = dict(plugin.sys_info())
+        self.assertIn("line_map_misses = 1", info["counters"])
+
+    def test_write_counters(self):
+        self.make_template("Hello {{ name }}\n")
+        self.run_django_coverage(context={"name": "Ned"})
+        lines = []
+        self.django_plugins()[0].write_counters(lines.append)
+        self.assertIn("django_coverage_plugin counters", lines[0])
+        self.assertTrue(any("line_number_range_calls" in line for line in lines[1:]))
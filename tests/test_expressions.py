@@ -0,0 +1,82 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of timing template expressions and filters."""
+
+import io
+import os.path
+
+from django.template.base import FilterExpression
+
+from django_coverage_plugin.expressions import (
+    ExpressionProbe,
+    ExpressionTimes,
+    expression_report,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class ExpressionTimesTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="main.html", text="""\
+            {{ who|upper }}
+            {% for item in items %}
+                {{ item|safe }} {{ items|join:", " }}
+            {% endfor %}
+            """)
+        self.context = {"who": "world", "items": ["<b>", "<i>"]}
+
+    def lines(self, probe):
+        return {
+            (lineno, name): stats
+            for (filename, lineno, name), stats in probe.times.stats.items()
+            if os.path.basename(filename) == "main.html"
+        }
+
+    def test_expression_times(self):
+        original = FilterExpression.resolve
+        probe = ExpressionProbe()
+        self.add_probe(probe)
+        text = get_template("main.html").render(self.context)
+        # The filters still work as they should.
+        self.assertIn("WORLD", text)
+        self.assertIn("<b> &lt;b&gt;, &lt;i&gt;", text)
+
+        lines = self.lines(probe)
+        self.assertEqual(
+            {key: stats[0] for key, stats in lines.items()},
+            {
+                (1, "who|upper"): 1, (1, "|upper"): 1,
+                (2, "items"): 1,
+                (3, "item|safe"): 2, (3, "|safe"): 2,
+                (3, 'items|join:", "'): 2, (3, "|join"): 2,
+            },
+        )
+        self.assertGreaterEqual(lines[1, "who|upper"][1], lines[1, "|upper"][1])
+        self.assertEqual(FilterExpression.resolve, original)
+
+    def test_report(self):
+        probe = ExpressionProbe()
+        self.add_probe(probe)
+        probe.clock = iter(range(0, 10**9, 10**6)).__next__
+        get_template("main.html").render(self.context)
+
+        out = io.StringIO()
+        expression_report(probe.times, out, top=3)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 1 + 3 + 2 + 3)
+        self.assertIn('main.html:3  {{ item|safe }} {{ items|join:", " }}', report[1])
+        self.assertEqual(report[5].split(), ["calls", "ms", "filter"])
+        self.assertEqual({line.split()[2] for line in report[6:]}, {"upper", "safe", "join"})
+
+    def test_expression_times_option(self):
+        data_file = self.run_probe_option(
+            "expression_times", ExpressionProbe, "expressions", "main.html", self.context,
+        )
+        self.assertIn("main.html:1  {{ who|upper }}", self.stdout())
+        times = ExpressionTimes.read(data_file)
+        self.assertEqual({row[0]: row[1] for row in times.filter_totals()}["safe"], 2)
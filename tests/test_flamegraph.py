@@ -0,0 +1,80 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the render stacks for flame graphs."""
+
+import os.path
+
+from django_coverage_plugin.flamegraph import RenderStacks, StackProbe
+from django_coverage_plugin.plugin import DjangoTemplatePluginException
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class RenderStacksTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="base.html", text="""\
+            <h1>{% block title %}{% endblock %}</h1>
+            {% block body %}{% endblock %}
+            """)
+        self.make_template(name="part.html", text="Part {{ i }}\n")
+        self.make_template(name="main.html", text="""\
+            {% extends "base.html" %}
+            {% block title %}Title{% endblock %}
+            {% block body %}
+            {% for i in "ab" %}
+                {% if i %}{% include "part.html" %}{% endif %}
+            {% endfor %}
+            {% endblock %}
+            """)
+
+    def short_stacks(self, stacks):
+        """Make the file names in the frames of `stacks` shorter."""
+        return {
+            ";".join(os.path.basename(frame) for frame in stack.split(";")): us
+            for stack, us in stacks.items()
+        }
+
+    def test_stacks(self):
+        probe = StackProbe()
+        self.add_probe(probe)
+        get_template("main.html").render({})
+
+        stacks = self.short_stacks(probe.stacks.stacks)
+        # Blocks render where the parent template has them.
+        root = "main.html;main.html:1 extends"
+        body = root + ";base.html:2 block body"
+        self.assertEqual(sorted(stacks), [
+            "main.html",
+            root,
+            root + ";base.html:1 block title",
+            body,
+            body + ";main.html:4 for",
+            body + ";main.html:4 for;main.html:5 if",
+            body + ";main.html:4 for;main.html:5 if;main.html:5 include",
+        ])
+        self.assertTrue(all(ns > 0 for ns in stacks.values()))
+        self.assertEqual(probe.frames, [])
+
+    def test_read_and_write(self):
+        stacks = RenderStacks({"a.html;a.html:2 for": 17, "a.html": 3})
+        stacks.write("stacks.txt")
+        with open("stacks.txt") as f:
+            self.assertEqual(f.read(), "a.html 3\na.html;a.html:2 for 17\n")
+        stacks.update(RenderStacks.read("stacks.txt"))
+        self.assertEqual(stacks.stacks, {"a.html;a.html:2 for": 34, "a.html": 6})
+
+        self.make_file("bad.txt", "a.html;b.html\n")
+        msg = r"Couldn't read render stacks bad.txt: line 1 isn't a collapsed stack"
+        with self.assertRaisesRegex(DjangoTemplatePluginException, msg):
+            RenderStacks.read("bad.txt")
+
+    def test_render_stacks_option(self):
+        data_file = self.run_probe_option("render_stacks", StackProbe, "stacks", "main.html")
+        lines = self.stdout().splitlines()
+        self.assertEqual(len(lines), 7)
+        stacks = self.short_stacks(RenderStacks.read(data_file).stacks)
+        self.assertIn("main.html;main.html:1 extends;base.html:2 block body", stacks)
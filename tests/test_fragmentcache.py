@@ -0,0 +1,77 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of counting {% cache %} hits and misses."""
+
+import io
+import os.path
+
+from django.core.cache import cache
+# Import this before the tests start: each test forgets the modules imported
+# during it, and a re-imported module would have a different CacheNode.
+from django.templatetags.cache import CacheNode  # noqa: F401
+
+from django_coverage_plugin.fragmentcache import (
+    CacheProbe,
+    CacheStats,
+    cache_report,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class CacheProbeTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.make_template(name="main.html", text="""\
+            {% load cache %}
+            {% cache 500 greeting who %}
+                Hello {{ who }}
+            {% endcache %}
+            {% cache 500 empty %}{% endcache %}
+            """)
+
+    def render(self, probe, *whos):
+        for who in whos:
+            get_template("main.html").render({"who": who})
+        return {
+            lineno: stats
+            for filename, lines in probe.stats.files.items()
+            for lineno, stats in lines.items()
+            if os.path.basename(filename) == "main.html"
+        }
+
+    def test_hits_and_misses(self):
+        probe = CacheProbe()
+        self.add_probe(probe)
+        lines = self.render(probe, "world", "world", "you", "world")
+        self.assertEqual(lines[2][:2], [2, 2])
+        self.assertGreater(lines[2][2], 0)
+        # An empty fragment renders nothing even when it misses.
+        self.assertEqual(lines[5], [4, 0, 0])
+        self.assertEqual(probe.frames, [])
+
+    def test_report(self):
+        probe = CacheProbe()
+        self.add_probe(probe)
+        self.render(probe, "a", "b", "c", "a")
+
+        out = io.StringIO()
+        cache_report(probe.stats, out, top=1)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 2)
+        self.assertEqual(report[1].split()[:3], ["1", "3", "25.0%"])
+        self.assertIn("main.html:2  {% cache 500 greeting who %}", report[1])
+
+    def test_cache_stats_option(self):
+        data_file = self.run_probe_option(
+            "cache_stats", CacheProbe, "cache", "main.html", {"who": "world"},
+        )
+        self.assertIn("main.html:2  {% cache 500 greeting who %}", self.stdout())
+        stats = CacheStats.read(data_file)
+        [row] = [row for row in stats.rows() if row[1] == 2]
+        self.assertEqual(row[2:4], (0, 1))
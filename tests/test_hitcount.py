@@ -0,0 +1,71 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the per-line render hit counts."""
+
+import io
+import os.path
+
+from django_coverage_plugin.__main__ import main
+from django_coverage_plugin.hitcount import HitCounter, HitCounts, text_report
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class HitCountTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="part.html", text="Part {{ i }}\n")
+        self.make_template(name="main.html", text="""\
+            Hello
+            {% for i in items %}
+                {% include "part.html" %}
+            {% endfor %}
+            """)
+
+    def test_counting(self):
+        counter = HitCounter()
+        self.add_probe(counter)
+        get_template("main.html").render({"items": [1, 2, 3]})
+        get_template("main.html").render({"items": [1, 2]})
+
+        files = {os.path.basename(f): lines for f, lines in counter.counts.files.items()}
+        self.assertEqual(files["main.html"], {1: [2], 2: [2], 3: [5]})
+        # Two nodes on the line: "Part " and {{ i }}.
+        self.assertEqual(files["part.html"], {1: [10]})
+
+    def test_text_report(self):
+        counter = HitCounter()
+        self.add_probe(counter)
+        get_template("main.html").render({"items": [1, 2, 3]})
+
+        out = io.StringIO()
+        text_report(counter.counts, out)
+        report = out.getvalue()
+        self.assertIn("main.html: 5 hits", report)
+        self.assertIn("part.html: 6 hits", report)
+        self.assertIn("     3          3      {% include \"part.html\" %}", report)
+        self.assertIn("     4             {% endfor %}", report)
+        # The busiest template is first.
+        self.assertLess(report.index("part.html"), report.index("main.html"))
+
+    def test_hit_counts_option(self):
+        data_file = self.run_probe_option(
+            "hit_counts", HitCounter, "hits", "main.html", {"items": [1, 2, 3, 4]},
+        )
+        self.assertIn("main.html: 6 hits", self.stdout())
+        counts = HitCounts.read(data_file)
+        [main_lines] = [lines for f, lines in counts.files.items() if f.endswith("main.html")]
+        self.assertEqual(main_lines, {1: [1], 2: [1], 3: [4]})
+
+        self.assertEqual(main(["hits", data_file, "--html", "hits_html"]), 0)
+        with open("hits_html/index.html") as f:
+            index = f.read()
+        self.assertIn("main.html", index)
+        page = [name for name in os.listdir("hits_html") if name.startswith("main.html_")]
+        with open(os.path.join("hits_html", page[0])) as f:
+            html = f.read()
+        self.assertIn('<td class="hits">4</td>', html)
+        self.assertIn('<span class="key">{% include &quot;part.html&quot; %}</span>', html)
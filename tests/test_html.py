@@ -5,6 +5,8 @@
 
 import glob
 
+from django_coverage_plugin.plugin import FileReporter
+
 from .plugin_test import DjangoPluginTestCase
 
 
@@ -21,3 +23,85 @@ class HtmlTest(DjangoPluginTestCase):
         with open(html_file) as fhtml:
             html = fhtml.read()
         self.assertIn('<span class="txt">Simple &#169; 2015</span>', html)
+
+    def test_tags_and_variables(self):
+        self.make_template("""\
+            {% if name %}
+            Hello, {{ name }}
+            {% endif %}
+            """)
+
+        self.run_django_coverage(context={'name': 'John'})
+        self.cov.html_report()
+        html_file = glob.glob("htmlcov/*_test_tags_and_variables_html.html")[0]
+        with open(html_file) as fhtml:
+            # Older versions of coverage.py wrote spaces as &nbsp;
+            html = fhtml.read().replace("&nbsp;", " ")
+        self.assertIn('<span class="key">{% if name %}</span>', html)
+        self.assertIn('<span class="txt">Hello, </span><span class="nam">{{ name }}</span>', html)
+
+
+class SourceTokenLinesTest(DjangoPluginTestCase):
+
+    def token_lines(self, text):
+        filename = self.make_template(text)
+        reporter = FileReporter(filename)
+        token_lines = list(reporter.source_token_lines())
+        # The tokens must reproduce the source exactly.
+        self.assertEqual(
+            ["".join(t for _, t in line) for line in token_lines],
+            reporter.source().splitlines(),
+        )
+        return token_lines
+
+    def test_text(self):
+        self.assertEqual(
+            self.token_lines("Hello\n\nWorld\n"),
+            [[("txt", "Hello")], [], [("txt", "World")]],
+        )
+
+    def test_tags(self):
+        self.assertEqual(
+            self.token_lines("{# note #}\n{% for x in xs %}<b>{{ x }}</b>{% endfor %}"),
+            [
+                [("com", "{# note #}")],
+                [
+                    ("key", "{% for x in xs %}"),
+                    ("txt", "<b>"),
+                    ("nam", "{{ x }}"),
+                    ("txt", "</b>"),
+                    ("key", "{% endfor %}"),
+                ],
+            ],
+        )
+
+    def test_comment_block(self):
+        self.assertEqual(
+            self.token_lines("{% comment %}\nOld {{ x }}\n{% endcomment %}\nNew\n"),
+            [
+                [("key", "{% comment %}")],
+                [("com", "Old "), ("com", "{{ x }}")],
+                [("key", "{% endcomment %}")],
+                [("txt", "New")],
+            ],
+        )
+
+    def test_verbatim(self):
+        self.assertEqual(
+            self.token_lines("{% verbatim %}{{ x }}{% endverbatim %}\n{{ y }}\n"),
+            [
+                [("key", "{% verbatim %}"), ("txt", "{{ x }}"), ("key", "{% endverbatim %}")],
+                [("nam", "{{ y }}")],
+            ],
+        )
+
+    def test_crlf(self):
+        self.assertEqual(
+            self.token_lines("One\r\n{{ two }}\r\nThree"),
+            [[("txt", "One")], [("nam", "{{ two }}")], [("txt", "Three")]],
+        )
+
+    def test_is_a_generator(self):
+        filename = self.make_template("Hello\n" * 10)
+        token_lines = FileReporter(filename).source_token_lines()
+        self.assertEqual(next(token_lines), [("txt", "Hello")])
@@ -0,0 +1,104 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of what importing django_coverage_plugin costs."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import django_coverage_plugin
+from django_coverage_plugin.plugin import PROBE_OPTIONS
+
+
+def imported_modules(code):
+    """Run `code` in a fresh Python, and return the modules it imported."""
+    code += "\nimport sys\nprint('\\n'.join(sorted(sys.modules)))\n"
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return set(out.split())
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_import_doesnt_load_templates(self):
+        modules = imported_modules("import django_coverage_plugin")
+        self.assertIn("django_coverage_plugin.plugin", modules)
+        self.assertEqual({m for m in modules if m.startswith("django.template")}, set())
+
+    def test_plugin_creation_doesnt_load_templates(self):
+        modules = imported_modules(
+            "from django_coverage_plugin.plugin import DjangoTemplatePlugin\n" +
+            "DjangoTemplatePlugin({})\n"
+        )
+        self.assertEqual({m for m in modules if m.startswith("django.template")}, set())
+
+    def test_probe_options_dont_load_templates(self):
+        # The probes are made with the plugin, but only find the template
+        # classes they watch when the first template is traced.
+        options = {option: f"plugin_{option}.out" for option in PROBE_OPTIONS}
+        modules = imported_modules(
+            "from django_coverage_plugin.plugin import DjangoTemplatePlugin\n" +
+            f"DjangoTemplatePlugin({options!r})\n"
+        )
+        self.assertEqual({m for m in modules if m.startswith("django.template")}, set())
+
+    def test_recording_workload_doesnt_load_templates(self):
+        modules = imported_modules(
+            "from django_coverage_plugin.plugin import DjangoTemplatePlugin\n" +
+            "DjangoTemplatePlugin({'record_workload': 'workload.pkl'})\n"
+        )
+        self.assertEqual(
+            {m for m in modules if m.startswith(("django.template", "django.test"))}, set()
+        )
+
+    def test_claiming_doesnt_load_templates(self):
+        # Files are claimed while django.template is still being imported, so
+        # claiming one mustn't import it.
+        modules = imported_modules(
+            "import os\n" +
+            "from django_coverage_plugin.plugin import DjangoTemplatePlugin\n" +
+            "plugin = DjangoTemplatePlugin({})\n" +
+            "plugin.file_tracer(os.path.join(plugin.django_template_dir, 'base.py'))\n"
+        )
+        self.assertEqual({m for m in modules if m.startswith("django.template")}, set())
+
+    def test_measuring_from_a_fresh_start(self):
+        # Measure a program that hasn't imported Django's templates yet.
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(django_coverage_plugin.__file__))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, "hello.html"), "w") as f:
+                f.write("Hello {{ name }}\n")
+            with open(os.path.join(tmpdir, ".coveragerc"), "w") as f:
+                f.write("[run]\nplugins = django_coverage_plugin\n")
+            with open(os.path.join(tmpdir, "render.py"), "w") as f:
+                f.write(RENDER_PROGRAM)
+            proc = subprocess.run(
+                [sys.executable, "-m", "coverage", "run", "render.py"],
+                cwd=tmpdir, env=env, capture_output=True, text=True, check=True,
+            )
+            self.assertEqual(proc.stdout, "Hello Ned\n")
+            self.assertNotIn("Disabling plug-in", proc.stderr)
+            proc = subprocess.run(
+                [sys.executable, "-m", "coverage", "report", "--include=*.html"],
+                cwd=tmpdir, env=env, capture_output=True, text=True, check=True,
+            )
+            self.assertIn("hello.html", proc.stdout)
+
+
+RENDER_PROGRAM = """\
+import django
+from django.conf import settings
+
+settings.configure(TEMPLATES=[{
+    "BACKEND": "django.template.backends.django.DjangoTemplates",
+    "DIRS": ["."],
+    "OPTIONS": {"debug": True},
+}])
+django.setup()
+
+from django.template.loader import get_template
+print(get_template("hello.html").render({"name": "Ned"}), end="")
+"""
@@ -0,0 +1,88 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the template line index for django_coverage_plugin."""
+
+import json
+
+from django_coverage_plugin.__main__ import main
+from django_coverage_plugin.index import (
+    LineIndex,
+    lines_to_ranges,
+    ranges_to_lines,
+    source_digest,
+)
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class LineIndexTest(DjangoPluginTestCase):
+
+    def test_ranges(self):
+        self.assertEqual(lines_to_ranges({1, 2, 3, 5, 7, 8}), [[1, 3], [5, 5], [7, 8]])
+        self.assertEqual(lines_to_ranges(set()), [])
+        self.assertEqual(ranges_to_lines([[1, 3], [5, 5], [7, 8]]), {1, 2, 3, 5, 7, 8})
+
+    def test_analyze(self):
+        self.make_template(name="one.html", text="Hello\n{{ name }}\n")
+        self.make_template(name="two.html", text="{% if x %}\nYes\n{% endif %}\n")
+        self.make_template(name="junk.tex", text="Not a template")
+
+        ret = main(["analyze", "templates", "-o", "lines.json", "-j", "1"])
+        self.assertEqual(ret, 0)
+        self.assertIn("Wrote 2 templates to lines.json", self.stdout())
+
+        index = LineIndex.read("lines.json")
+        self.assertEqual(index.lines_for("Hello\n{{ name }}\n"), {1, 2})
+        self.assertEqual(index.lines_for("{% if x %}\nYes\n{% endif %}\n"), {1, 2})
+        self.assertIsNone(index.lines_for("Something else"))
+
+    def test_analyze_in_parallel(self):
+        for i in range(20):
+            self.make_template(name=f"t{i}.html", text="line\n" * (i+1))
+
+        ret = main(["analyze", "templates", "-o", "lines.json", "-j", "2"])
+        self.assertEqual(ret, 0)
+
+        index = LineIndex.read("lines.json")
+        for i in range(20):
+            self.assertEqual(index.lines_for("line\n" * (i+1)), set(range(1, i+2)))
+
+    def test_analyze_unreadable_file(self):
+        self.make_template(name="main.html", text="Hello")
+        self.make_file(self._path("changelog.txt"), bytes=b"sh\xf6n")
+
+        ret = main(["analyze", "templates", "-o", "lines.json", "-j", "1"])
+        self.assertEqual(ret, 1)
+        self.assertIn("changelog.txt", self.stderr())
+        self.assertIn("invalid start byte", self.stderr())
+        self.assertEqual(LineIndex.read("lines.json").lines_for("Hello"), {1})
+
+    def test_reporting_uses_index(self):
+        self.make_template("Hello\nWorld\n")
+        # Write an index with deliberately wrong lines, to prove it is used.
+        with open("lines.json", "w") as f:
+            json.dump({"version": 1, "lines": {source_digest("Hello\nWorld\n"): [[2, 2]]}}, f)
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            line_index = lines.json
+            """)
+
+        self.run_django_coverage()
+        self.assert_analysis([2])
+
+    def test_edited_template_isnt_in_index(self):
+        self.make_template("Hello\nWorld\n")
+        main(["analyze", "templates", "-o", "lines.json", "-j", "1"])
+        self.make_template("Hello\n{% if x %}\nWorld\n{% endif %}\n")
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            line_index = lines.json
+            """)
+
+        self.run_django_coverage()
+        self.assert_analysis([1, 2, 3], missing=[3])
@@ -0,0 +1,77 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of tracing tag libraries for django_coverage_plugin."""
+
+from django.test.utils import override_settings
+
+from django_coverage_plugin.plugin import (
+    DjangoTemplatePlugin,
+    DjangoTemplatePluginException,
+)
+
+from .plugin_test import DjangoPluginTestCase, get_test_settings
+
+# A tag library with a node that renders itself without Node.render_annotated,
+# so the plugin only sees it if the library is traced.
+SHOUT_TAGS = """\
+    from django import template
+
+    register = template.Library()
+
+    class ShoutNode(template.Node):
+        def __init__(self, nodelist):
+            self.nodelist = nodelist
+
+        def render_annotated(self, context):
+            return self.nodelist.render(context).upper()
+
+    @register.tag
+    def shout(parser, token):
+        nodelist = parser.parse(("endshout",))
+        parser.delete_first_token()
+        return ShoutNode(nodelist)
+    """
+
+
+class TagLibraryTest(DjangoPluginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        the_settings = get_test_settings()
+        the_settings['TEMPLATES'][0]['OPTIONS']['libraries'] = {
+            'shout_tags': 'shoutlib.shout_tags',
+        }
+        overridden = override_settings(**the_settings)
+        overridden.enable()
+        self.addCleanup(overridden.disable)
+
+        self.make_file("shoutlib/__init__.py", "")
+        self.make_file("shoutlib/shout_tags.py", SHOUT_TAGS)
+        self.make_template("""\
+            {% load shout_tags %}
+            {% shout %}
+            Hello
+            {% endshout %}
+            """)
+
+    def test_untraced_library(self):
+        text = self.run_django_coverage()
+        self.assertEqual(text, "\n\nHELLO\n\n")
+        self.assert_analysis([1, 2, 3], missing=[2])
+
+    def test_traced_library(self):
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            tag_libraries = shoutlib.shout_tags
+            """)
+        text = self.run_django_coverage()
+        self.assertEqual(text, "\n\nHELLO\n\n")
+        self.assert_analysis([1, 2, 3])
+
+    def test_unknown_library(self):
+        msg = r"Couldn't find tag library module 'shoutlib.whisper_tags'"
+        with self.assertRaisesRegex(DjangoTemplatePluginException, msg):
+            DjangoTemplatePlugin({"tag_libraries": "shoutlib.shout_tags, shoutlib.whisper_tags"})
@@ -0,0 +1,190 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the line-map store shared by processes."""
+
+import os
+import os.path
+import types
+
+import coverage
+
+from django_coverage_plugin.linemapstore import (
+    MIN_STALE_RECORDS,
+    RECORD_MAGIC,
+    LineMapStore,
+)
+from django_coverage_plugin.memory import memory_usage
+from django_coverage_plugin.plugin import DjangoTemplatePlugin, make_line_map
+
+from .plugin_test import DjangoPluginTestCase
+
+
+def old_version(i):
+    """A stat result for an earlier version `i` of a template."""
+    return types.SimpleNamespace(st_mtime_ns=i, st_size=i)
+
+
+class LineMapStoreTest(DjangoPluginTestCase):
+
+    def store(self, filename="maps.bin"):
+        store = LineMapStore(filename)
+        self.addCleanup(store.close)
+        return store
+
+    def test_sharing(self):
+        one = self.make_template(name="one.html", text="Hello\n{{ name }}\n")
+        two = self.make_template(name="two.html", text="Bye\n")
+        writer = self.store()
+        reader = self.store()
+        self.assertIsNone(reader.get(one, os.stat(one)))
+
+        writer.append(one, os.stat(one), [6, 17])
+        self.assertEqual(reader.get(one, os.stat(one)), [6, 17])
+        writer.append(two, os.stat(two), [4])
+        self.assertEqual(reader.get(two, os.stat(two)), [4])
+        self.assertEqual(reader.offset, os.path.getsize("maps.bin"))
+
+        # An edited template isn't found.
+        self.make_template(name="one.html", text="Hello again\n{{ name }}\n")
+        self.assertIsNone(reader.get(one, os.stat(one)))
+
+    def test_damaged_and_unfinished_records(self):
+        one = self.make_template(name="one.html", text="Hello\n")
+        writer = self.store()
+        writer.append(one, os.stat(one), [6])
+        with open("maps.bin", "rb") as f:
+            record = f.read()
+        self.assertTrue(record.startswith(RECORD_MAGIC))
+        # A damaged record, a good one, and half of another.
+        damaged = bytearray(record)
+        damaged[-1] ^= 0xff
+        two = self.make_template(name="two.html", text="Bye\n")
+        writer.append(two, os.stat(two), [4])
+        with open("maps.bin", "rb") as f:
+            good = f.read()[len(record):]
+        with open("maps.bin", "wb") as f:
+            f.write(b"junk" + damaged + good + good[:10])
+
+        reader = self.store()
+        self.assertIsNone(reader.get(one, os.stat(one)))
+        self.assertEqual(reader.get(two, os.stat(two)), [4])
+        self.assertEqual(reader.offset, os.path.getsize("maps.bin") - 10)
+
+        # The rest of the unfinished record arrives.
+        with open("maps.bin", "ab") as f:
+            f.write(good[10:])
+        reader.refresh()
+        self.assertEqual(reader.offset, os.path.getsize("maps.bin"))
+
+    def test_only_the_latest_records_are_indexed(self):
+        one = self.make_template(name="one.html", text="Hello\n")
+        writer = self.store()
+        for i in range(5):
+            writer.append(one, old_version(i), [i])
+        # Workers racing to make the same line map write copies of it.
+        writer.append(one, os.stat(one), [6])
+        writer.append(one, os.stat(one), [6])
+        reader = self.store()
+        self.assertEqual(reader.get(one, os.stat(one)), [6])
+        self.assertEqual(list(reader.index), [one])
+        self.assertEqual(reader.stale, 5)
+
+        # The file stays mapped, and is mapped again as it grows.
+        two = self.make_template(name="two.html", text="Bye\n")
+        writer.append(two, os.stat(two), [4, 8])
+        self.assertEqual(reader.get(two, os.stat(two)), [4, 8])
+        self.assertEqual(len(reader.data), os.path.getsize("maps.bin"))
+
+    def write_stale_store(self):
+        """Write a store with one.html, two.html, and many stale records."""
+        one = self.make_template(name="one.html", text="Hello\n")
+        two = self.make_template(name="two.html", text="Bye\n")
+        gone = self.make_template(name="gone.html", text="Gone\n")
+        writer = self.store()
+        writer.append(gone, os.stat(gone), [5])
+        for i in range(MIN_STALE_RECORDS):
+            writer.append(one, old_version(i), [i])
+        writer.append(one, os.stat(one), [6])
+        writer.append(two, os.stat(two), [4])
+        os.remove(gone)
+        writer.close()
+        return one, two
+
+    def test_compacting(self):
+        one, two = self.write_stale_store()
+        size = os.path.getsize("maps.bin")
+
+        # Opening a store that's mostly stale rewrites it with the current
+        # records.
+        reader = self.store()
+        self.assertEqual(reader.get(one, os.stat(one)), [6])
+        self.assertEqual(reader.get(two, os.stat(two)), [4])
+        self.assertEqual((len(reader.index), reader.stale), (2, 0))
+        self.assertLess(os.path.getsize("maps.bin"), size / 10)
+        self.assertEqual(self.store().get(one, os.stat(one)), [6])
+
+    def test_compacting_while_open(self):
+        one, two = self.write_stale_store()
+        three = self.make_template(name="three.html", text="Three\n")
+        four = self.make_template(name="four.html", text="Four\n")
+        five = self.make_template(name="five.html", text="Five\n")
+        # A store open before the compaction, that has appended.
+        before = self.store()
+        self.assertEqual(before.get(two, os.stat(two)), [4])
+        before.append(three, os.stat(three), [3])
+
+        compacting = self.store()
+        self.assertEqual(compacting.get(one, os.stat(one)), [6])
+        compacting.append(four, os.stat(four), list(range(1000)))
+
+        # The open store reads and appends to the new file.
+        self.assertEqual(before.get(four, os.stat(four)), list(range(1000)))
+        self.assertEqual(before.get(three, os.stat(three)), [3])
+        before.append(five, os.stat(five), [5])
+        self.assertEqual(compacting.get(five, os.stat(five)), [5])
+
+    def test_copies_arent_stale(self):
+        one = self.make_template(name="one.html", text="Hello\n")
+        writer = self.store()
+        for _ in range(2 * MIN_STALE_RECORDS):
+            writer.append(one, os.stat(one), [6])
+        size = os.path.getsize("maps.bin")
+        self.assertEqual(self.store().get(one, os.stat(one)), [6])
+        self.assertEqual(os.path.getsize("maps.bin"), size)
+
+    def test_few_stale_records_are_kept(self):
+        one = self.make_template(name="one.html", text="Hello\n")
+        writer = self.store()
+        for i in range(10):
+            writer.append(one, old_version(i), [i])
+        writer.append(one, os.stat(one), [6])
+        size = os.path.getsize("maps.bin")
+        self.assertEqual(self.store().get(one, os.stat(one)), [6])
+        self.assertEqual(os.path.getsize("maps.bin"), size)
+
+    def test_plugins_share_line_maps(self):
+        text = "Hello\n{{ name }}\n" * 10
+        filename = self.make_template(name="main.html", text=text)
+        first = DjangoTemplatePlugin({"line_map_store": "maps.bin"})
+        second = DjangoTemplatePlugin({"line_map_store": "maps.bin"})
+        self.assertEqual(first.get_line_map(filename), make_line_map(text))
+        self.assertEqual(second.get_line_map(filename), make_line_map(text))
+        self.addCleanup(first.line_map_store.close)
+        self.addCleanup(second.line_map_store.close)
+
+        self.assertEqual(first.counters["source_bytes_read"], len(text))
+        self.assertEqual(first.counters["line_map_store_hits"], 0)
+        self.assertEqual(second.counters["source_bytes_read"], 0)
+        self.assertEqual(second.counters["line_map_store_hits"], 1)
+
+        # The store's index is counted in the memory used.
+        [row] = [row for row in memory_usage(second) if row[0] == "line_store"]
+        self.assertEqual(row[1], "maps.bin")
+        self.assertGreater(row[2], 0)
+
+    def test_store_goes_with_the_data_file(self):
+        cov = coverage.Coverage(data_file="data/.coverage", config_file=False)
+        plugin = DjangoTemplatePlugin({"line_map_store": "maps.bin"})
+        plugin.configure(cov.config)
+        self.assertEqual(plugin.line_map_store_file, os.path.abspath("data/maps.bin"))
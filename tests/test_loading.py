@@ -0,0 +1,82 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of charging template loads to the tags that ran them."""
+
+import io
+import os.path
+
+from django.template.base import Template as BaseTemplate
+from django.template.engine import Engine
+
+from django_coverage_plugin.loading import LoadProbe, LoadTimes, load_report
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class LoadTimesTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="base.html", text="Base {% block b %}{% endblock %}\n")
+        self.make_template(name="part.html", text="Part {{ i }}\n")
+        self.make_template(name="main.html", text="""\
+            {% extends "base.html" %}
+            {% block b %}
+            {% for i in "abc" %}
+                {% include "part.html" %}
+                {% include name %}
+            {% endfor %}
+            {% endblock %}
+            """)
+
+    def lines(self, probe):
+        return {
+            lineno: stats
+            for filename, lines in probe.times.files.items()
+            for lineno, stats in lines.items()
+            if os.path.basename(filename) == "main.html"
+        }
+
+    def test_load_times(self):
+        originals = Engine.find_template, BaseTemplate.compile_nodelist
+        probe = LoadProbe()
+        self.add_probe(probe)
+        get_template("main.html").render({"name": "part.html"})
+        get_template("main.html").render({"name": "part.html"})
+
+        lines = self.lines(probe)
+        self.assertEqual(sorted(lines), [1, 4, 5])
+        # Each render loads the parent once.  An include loads its template
+        # once for each render.  Without the cached loader, each load
+        # compiles.
+        for lineno in [1, 4, 5]:
+            loads, load_ns, compiles, compile_ns = lines[lineno]
+            self.assertEqual((loads, compiles), (2, 2))
+            self.assertGreaterEqual(load_ns, compile_ns)
+            self.assertGreater(compile_ns, 0)
+
+        # The engine is back to normal between renders.
+        self.assertEqual((Engine.find_template, BaseTemplate.compile_nodelist), originals)
+
+    def test_report(self):
+        probe = LoadProbe()
+        self.add_probe(probe)
+        get_template("main.html").render({"name": "part.html"})
+
+        out = io.StringIO()
+        load_report(probe.times, out, sort="loads")
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 4)
+        self.assertIn('main.html:1  {% extends "base.html" %}', out.getvalue())
+        self.assertIn('main.html:4  {% include "part.html" %}', out.getvalue())
+        self.assertEqual(report[1].split()[0], "1")
+
+    def test_load_times_option(self):
+        data_file = self.run_probe_option(
+            "load_times", LoadProbe, "loads", "main.html", {"name": "part.html"},
+        )
+        self.assertIn("main.html:5  {% include name %}", self.stdout())
+        rows = LoadTimes.read(data_file).rows("loads")
+        self.assertEqual(len(rows), 3)
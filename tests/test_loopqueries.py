@@ -0,0 +1,116 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of finding loops that run a query on every iteration."""
+
+import io
+import os.path
+import unittest
+
+from django_coverage_plugin.loopqueries import (
+    LoopQueries,
+    LoopQueryDetector,
+    loop_query_report,
+    query_shape,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+from .test_queries import Lazy
+
+
+class QueryShapeTest(unittest.TestCase):
+
+    def test_query_shape(self):
+        self.assertEqual(
+            query_shape('SELECT "a"."id"\n  FROM "a" WHERE "a"."id" = %s LIMIT 21'),
+            'SELECT "a"."id" FROM "a" WHERE "a"."id" = %s LIMIT ?',
+        )
+        self.assertEqual(
+            query_shape("SELECT x FROM t WHERE y IN (%s, %s, %s)"),
+            query_shape("SELECT x FROM t WHERE y IN (%s,%s)"),
+        )
+        self.assertEqual(query_shape("SELECT 1"), query_shape("SELECT 2"))
+
+
+class LoopQueryTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="part.html", text="Count: {{ thing.count }}\n")
+        self.make_template(name="main.html", text="""\
+            Hello
+            {% for thing in things %}
+                {% include "part.html" %}
+            {% endfor %}
+            {% for i in lazy %}{{ i }}{% endfor %}
+            {% for row in rows %}
+                {% for thing in row %}{{ thing.count }}{% endfor %}
+            {% endfor %}
+            """)
+
+    def found(self, detector):
+        return {
+            (os.path.basename(row[0]), row[1]): row[3:]
+            for row in detector.found.rows()
+        }
+
+    def test_finding_loops(self):
+        detector = LoopQueryDetector()
+        self.add_probe(detector)
+        get_template("main.html").render({
+            "things": [Lazy(0)] * 4,
+            "lazy": Lazy(3),
+            "rows": [[Lazy(0)] * 3, [Lazy(0)]],
+        })
+        # The loop over `things` queried in each of its four iterations.  The
+        # queries iterating `lazy` ran before its loop started.  The inner
+        # loop over `row` was only repeated in the first row.  The rows were
+        # lists, so the loop over `rows` had no queries of its own.
+        self.assertEqual(self.found(detector), {
+            ("main.html", 2): (1, 4, 4),
+            ("main.html", 7): (1, 3, 3),
+        })
+        self.assertEqual(detector.frames, [])
+
+    def test_nested_loop_sequences(self):
+        # The classic N+1: each author's books are queried as the inner loop
+        # finds its sequence, in each iteration of the outer loop.
+        self.make_template(name="authors.html", text="""\
+            {% for author in authors %}
+                {% for book in author.books %}{{ book }}{% endfor %}
+            {% endfor %}
+            """)
+
+        class Author:
+            books = Lazy(1)
+
+        detector = LoopQueryDetector()
+        self.add_probe(detector)
+        get_template("authors.html").render({"authors": [Author()] * 5})
+        self.assertEqual(self.found(detector), {("authors.html", 1): (1, 5, 5)})
+
+    def test_report(self):
+        detector = LoopQueryDetector()
+        self.add_probe(detector)
+        get_template("main.html").render({"things": [Lazy(0)] * 5, "lazy": [], "rows": []})
+
+        out = io.StringIO()
+        loop_query_report(detector.found, out)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 2)
+        self.assertIn("main.html:2  {% for thing in things %}", report[0])
+        self.assertEqual(report[1], "    5 queries in 1 renders, up to 5 iterations: SELECT ?")
+
+        out = io.StringIO()
+        loop_query_report(LoopQueries(), out)
+        self.assertEqual(out.getvalue(), "No queries repeated in loops.\n")
+
+    def test_loop_queries_option(self):
+        context = {"things": [Lazy(0)] * 3, "lazy": [], "rows": []}
+        data_file = self.run_probe_option(
+            "loop_queries", LoopQueryDetector, "loops", "main.html", context,
+        )
+        self.assertIn("main.html:2  {% for thing in things %}", self.stdout())
+        [row] = LoopQueries.read(data_file).rows()
+        self.assertEqual(row[2:], ("SELECT ?", 1, 3, 3))
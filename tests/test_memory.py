@@ -0,0 +1,69 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the memory accounting for the plugin's caches."""
+
+from unittest import mock
+
+from django_coverage_plugin.memory import memory_usage
+from django_coverage_plugin.plugin import DjangoTemplatePlugin
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class MemoryTest(DjangoPluginTestCase):
+
+    def get_plugin(self):
+        plugins = getattr(self.cov, "plugins", None) or self.cov._plugins
+        return next(pl for pl in plugins if isinstance(pl, DjangoTemplatePlugin))
+
+    def test_memory_usage(self):
+        self.make_template(name="small.html", text="Hello {{ name }}\n")
+        self.make_template(name="big.html", text="{{ name }} is here.\n" * 500)
+        self.run_django_coverage(name="small.html", context={"name": "Ned"})
+        self.run_django_coverage(name="big.html", context={"name": "Ned"})
+        plugin = self.get_plugin()
+        reporters = [plugin.file_reporter(self._path(name)) for name in ["small.html", "big.html"]]
+        for reporter in reporters:
+            reporter.lines()
+
+        usage = memory_usage(plugin)
+        # The tracing plugin of the second run has the line map for big.html.
+        kinds = [(cache, filename.rpartition("/")[2]) for cache, filename, _ in usage]
+        self.assertEqual(kinds, [
+            ("line_map", "big.html"),
+            ("source", "big.html"),
+            ("source", "small.html"),
+        ])
+        sizes = [size for _, _, size in usage]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+        self.assertGreater(sizes[1], 500 * len("{{ name }} is here.\n"))
+
+        # Reporters that are gone aren't counted.
+        del reporters, reporter
+        self.assertEqual([cache for cache, _, _ in memory_usage(plugin)], ["line_map"])
+
+        self.assertGreater(dict(plugin.sys_info())["cache_bytes"], 0)
+
+    def test_memory_report_option(self):
+        self.make_template("Hello {{ name }}\n")
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            memory_report = plugin_memory.txt
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(context={"name": "Ned"})
+        # The .coveragerc and run_django_coverage both name the plugin: the
+        # first one traces.
+        write, filename = next(
+            call.args for call in register.call_args_list
+            if getattr(call.args[0], "__name__", None) == "write_memory_report"
+        )
+        write(filename)
+        with open("plugin_memory.txt") as f:
+            report = f.read()
+        self.assertIn("line_map", report)
+        self.assertIn("test_memory_report_option.html", report)
+        self.assertIn("all ", report)
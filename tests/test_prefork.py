@@ -0,0 +1,65 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of warming up the plugin before forking."""
+
+import array
+import os.path
+import sys
+from unittest import mock
+
+from django_coverage_plugin.memory import line_map_bytes
+from django_coverage_plugin.plugin import (
+    DjangoTemplatePlugin,
+    get_line_number,
+    make_line_map,
+)
+from django_coverage_plugin.prefork import django_template_dirs, warm_up
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class WarmUpTest(DjangoPluginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.text = "Hello\n{{ name }}\n{% if x %}x{% endif %}\n"
+        self.main = self.make_template(name="main.html", text=self.text)
+        self.part = self.make_template(name="sub/part.html", text="Part\n")
+        self.make_file("templates/notes.md", "Not a template\n")
+        with open("templates/bad.html", "wb") as f:
+            f.write(b"\xff\xfe\xfa")
+        self.plugin = DjangoTemplatePlugin({})
+
+    def test_warm_up(self):
+        with mock.patch("django_coverage_plugin.prefork.gc") as gc:
+            count = warm_up(["templates"])
+        self.assertGreaterEqual(count, 2)
+        gc.freeze.assert_called_once_with()
+
+        line_map = self.plugin.source_map[self.main]
+        self.assertIsInstance(line_map, array.array)
+        self.assertEqual(list(line_map), make_line_map(self.text))
+        self.assertIn(self.part, self.plugin.source_map)
+        self.assertNotIn(os.path.abspath("templates/bad.html"), self.plugin.source_map)
+        self.assertEqual(get_line_number(line_map, self.text.index("{% if")), 3)
+        self.assertEqual(line_map_bytes(line_map), sys.getsizeof(line_map))
+
+        # The workers find the line maps already made.
+        misses = self.plugin.counters["line_map_misses"]
+        self.assertIs(self.plugin.get_line_map(self.main), line_map)
+        self.assertEqual(self.plugin.counters["line_map_misses"], misses)
+
+    def test_engine_template_dirs(self):
+        self.assertEqual(
+            [os.path.abspath(d) for d in django_template_dirs()],
+            [os.path.abspath("templates")],
+        )
+        with mock.patch("django_coverage_plugin.prefork.gc"):
+            warm_up(freeze=False)
+        self.assertIsInstance(self.plugin.source_map[self.main], array.array)
+
+    def test_warm_up_without_freezing(self):
+        with mock.patch("django_coverage_plugin.prefork.gc") as gc:
+            warm_up(["templates"], freeze=False)
+        gc.freeze.assert_not_called()
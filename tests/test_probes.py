@@ -0,0 +1,237 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the render hooks that profiling probes use."""
+
+import gc
+import glob
+import os.path
+import threading
+import tracemalloc
+from unittest import mock
+
+from django_coverage_plugin.__main__ import main
+from django_coverage_plugin.expressions import ExpressionProbe
+from django_coverage_plugin.plugin import PROBE_OPTIONS, DjangoTemplatePlugin
+from django_coverage_plugin.probes import Probe
+
+from .plugin_test import Context, DjangoPluginTestCase, Template, get_template
+
+
+class RecordingProbe(Probe):
+    """Record the enters and exits, with the depth of the stack."""
+
+    def __init__(self):
+        self.events = []
+
+    def enter(self, node, where, context):
+        self.events.append(("enter", type(node).__name__, where[1], len(self.hooks.stack)))
+
+    def exit(self, node, where, context):
+        self.events.append(("exit", type(node).__name__, where[1], len(self.hooks.stack)))
+
+
+class ProbeTestCase(DjangoPluginTestCase):
+    """A test case with a plugin running probes."""
+
+    def setUp(self):
+        super().setUp()
+        self.plugin = DjangoTemplatePlugin({})
+
+    def add_probe(self, probe):
+        """Add `probe` to the plugin, installing its hooks as tracing would."""
+        self.plugin.add_probe(probe)
+        if not self.plugin.render_hooks.installed:
+            self.plugin.render_hooks.install()
+            self.addCleanup(self.plugin.render_hooks.uninstall)
+
+    def uninstall_coverage_probes(self):
+        """Uninstall the render hooks of the plugins run_django_coverage made."""
+        for plugin in self.django_plugins():
+            if plugin.render_hooks:
+                self.addCleanup(plugin.render_hooks.uninstall)
+
+    def run_probe_option(self, option, probe_class, command, name, context=None):
+        """Render template `name` under coverage with probe option `option` set.
+
+        The `probe_class` probes save their data as they would at exit, and
+        the `command` subcommand combines and reports it.  Returns the name of
+        the combined data file.
+
+        """
+        data_file = f"plugin_{option}.data"
+        self.make_file(".coveragerc", f"""\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            {option} = {data_file}
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(name=name, context=context)
+        self.uninstall_coverage_probes()
+        # The .coveragerc and run_django_coverage both name the plugin, so
+        # there are two probes.  Coverage only asks the first plugin about
+        # template frames, so only its probe has its hooks installed and
+        # records anything.  Save them as if they were in different processes:
+        # the empty one writes nothing.
+        saves = [
+            call.args for call in register.call_args_list
+            if isinstance(getattr(call.args[0], "__self__", None), probe_class)
+        ]
+        self.assertEqual(len(saves), 2)
+        with mock.patch("socket.gethostname", side_effect=["one", "two"]):
+            for save, filename in saves:
+                save(filename)
+        self.assertEqual(len(glob.glob(data_file + ".*")), 1)
+        self.assertEqual(main([command, data_file]), 0)
+        return data_file
+
+
+class RenderHooksTest(ProbeTestCase):
+
+    def test_enter_and_exit(self):
+        self.make_template("""\
+            Hello
+            {% if name %}{{ name }}{% endif %}
+            """)
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        get_template(self.template_file).render({"name": "Ned"})
+
+        self.assertEqual(probe.events, [
+            ("enter", "TextNode", 1, 1),
+            ("exit", "TextNode", 1, 1),
+            ("enter", "IfNode", 2, 1),
+            ("enter", "VariableNode", 2, 2),
+            ("exit", "VariableNode", 2, 2),
+            ("exit", "IfNode", 2, 1),
+        ])
+        self.assertEqual(self.plugin.render_hooks.stack, [])
+
+    def test_where(self):
+        self.make_template("Hello\n{{ name }}\n")
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        # Keep the template, so its nodes stay in node_wheres.
+        template = get_template(self.template_file)
+        template.render({"name": "Ned"})
+        wheres = {where for where in self.plugin.render_hooks.node_wheres.values() if where}
+        self.assertEqual(
+            {(os.path.basename(filename), start, end) for filename, start, end in wheres},
+            {("test_where.html", 1, 1), ("test_where.html", 2, 2)},
+        )
+
+    def test_wheres_dont_keep_nodes(self):
+        # The test settings don't cache templates, so each render compiles
+        # new nodes.
+        self.make_template("Hello\n{% if name %}{{ name }}{% endif %}\n")
+        self.add_probe(RecordingProbe())
+        for _ in range(10):
+            get_template(self.template_file).render({"name": "Ned"})
+        gc.collect()
+        self.assertLessEqual(len(self.plugin.render_hooks.node_wheres), 4)
+
+    def test_exception(self):
+        self.make_template("{% if name %}{{ name.explode }}{% endif %}")
+        probe = RecordingProbe()
+        self.add_probe(probe)
+
+        class Exploding:
+            def explode(self):
+                raise ValueError("Boom")
+
+        with self.assertRaisesRegex(ValueError, "Boom"):
+            get_template(self.template_file).render({"name": Exploding()})
+        self.assertEqual(probe.events[-1], ("exit", "IfNode", 1, 1))
+        self.assertEqual(self.plugin.render_hooks.stack, [])
+
+    def test_threads(self):
+        from django.template.base import FilterExpression
+        resolve = FilterExpression.resolve
+        self.make_template("Hello\n{{ wait }}\n{{ name|upper }}\n")
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        self.add_probe(ExpressionProbe())
+        # Two threads render at once, each waiting for the other in the
+        # middle of the template.
+        barrier = threading.Barrier(2, timeout=10)
+        texts = []
+
+        def render():
+            texts.append(get_template(self.template_file).render({
+                "wait": barrier.wait, "name": "Ned",
+            }))
+
+        threads = [threading.Thread(target=render) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(texts), 2)
+        # Each thread has its own stack.
+        self.assertEqual({event[3] for event in probe.events}, {1})
+        self.assertEqual(self.plugin.render_hooks.stack, [])
+        # The expression probe put resolve back when both had finished.
+        self.assertEqual(FilterExpression.resolve, resolve)
+
+    def test_templates_that_arent_files(self):
+        from django.template import Context as DjangoContext
+        from django.template.engine import Engine
+        engine = Engine(debug=True, loaders=[
+            ("django.template.loaders.locmem.Loader", {"index.html": "Hello {{ name }}"}),
+        ])
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        text = engine.get_template("index.html").render(DjangoContext({"name": "Ned"}))
+        self.assertEqual(text, "Hello Ned")
+        self.assertEqual(probe.events, [])
+
+    def test_failing_probe(self):
+        self.make_template("Hello {{ name }}")
+
+        class FailingProbe(Probe):
+            def enter(self, node, where, context):
+                raise ValueError("Boom")
+
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        self.add_probe(FailingProbe())
+        with self.assertRaisesRegex(ValueError, "Boom"):
+            get_template(self.template_file).render({"name": "Ned"})
+        self.assertEqual(probe.events, [
+            ("enter", "TextNode", 1, 1),
+            ("exit", "TextNode", 1, 1),
+        ])
+        self.assertEqual(self.plugin.render_hooks.stack, [])
+
+    def test_string_templates_arent_seen(self):
+        probe = RecordingProbe()
+        self.add_probe(probe)
+        Template("Hello {{ name }}").render(Context({"name": "Ned"}))
+        self.assertEqual(probe.events, [])
+
+    def test_uninstall(self):
+        from django.template.base import Node, TextNode
+        originals = Node.render_annotated, TextNode.render_annotated
+        self.plugin.add_probe(RecordingProbe())
+        # The hooks wait until a template is traced.
+        self.assertEqual((Node.render_annotated, TextNode.render_annotated), originals)
+        self.plugin.render_hooks.install()
+        self.assertNotEqual((Node.render_annotated, TextNode.render_annotated), originals)
+        self.plugin.render_hooks.uninstall()
+        self.assertEqual((Node.render_annotated, TextNode.render_annotated), originals)
+
+    def test_nothing_traced(self):
+        # Commands like `coverage report` make the plugin, but never trace a
+        # template: they shouldn't hook anything, or write empty files.
+        tracing = tracemalloc.is_tracing()
+        options = {option: f"{option}.data" for option in PROBE_OPTIONS}
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            plugin = DjangoTemplatePlugin(options)
+        self.assertFalse(plugin.render_hooks.installed)
+        self.assertEqual(tracemalloc.is_tracing(), tracing)
+        self.assertEqual(len(register.call_args_list), len(PROBE_OPTIONS))
+        for call in register.call_args_list:
+            call.args[0](*call.args[1:])
+        self.assertEqual(glob.glob("*.data*"), [])
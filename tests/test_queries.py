@@ -0,0 +1,93 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of charging database queries to template lines."""
+
+import io
+import os.path
+
+from django.db import connection
+
+from django_coverage_plugin.queries import (
+    QueryCounter,
+    QueryCounts,
+    query_report,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+def query(n):
+    """Run `n` queries, and return how many ran."""
+    with connection.cursor() as cursor:
+        for _ in range(n):
+            cursor.execute("SELECT 1")
+    return n
+
+
+class Lazy:
+    """Something that queries the database when a template looks at it."""
+
+    def __init__(self, n):
+        self.n = n
+
+    def __iter__(self):
+        query(self.n)
+        return iter(range(self.n))
+
+    def count(self):
+        return query(1)
+
+
+class QueryCountTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="part.html", text="Count: {{ thing.count }}\n")
+        self.make_template(name="main.html", text="""\
+            Hello
+            {% for i in things %}
+                {% include "part.html" with thing=things %}
+            {% endfor %}
+            {{ things.count }}
+            """)
+
+    def test_counting(self):
+        counter = QueryCounter()
+        self.add_probe(counter)
+        get_template("main.html").render({"things": Lazy(3)})
+
+        files = {os.path.basename(f): lines for f, lines in counter.counts.files.items()}
+        self.assertEqual(
+            {lineno: stats[0] for lineno, stats in files["main.html"].items()},
+            {2: 3, 5: 1},
+        )
+        self.assertEqual(files["part.html"][1][0], 3)
+        self.assertGreater(files["part.html"][1][1], 0)
+
+        # Queries outside of templates aren't counted.
+        query(5)
+        self.assertEqual(sum(stats[0] for stats in files["main.html"].values()), 4)
+        self.assertEqual(connection.execute_wrappers, [])
+
+    def test_report(self):
+        counter = QueryCounter()
+        self.add_probe(counter)
+        get_template("main.html").render({"things": Lazy(10)})
+
+        out = io.StringIO()
+        query_report(counter.counts, out, top=2)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertIn("main.html:2  {% for i in things %}", report[1])
+        self.assertIn("part.html:1  Count: {{ thing.count }}", report[2])
+        self.assertEqual([line.split()[0] for line in report[1:]], ["10", "10"])
+
+    def test_query_counts_option(self):
+        data_file = self.run_probe_option(
+            "query_counts", QueryCounter, "queries", "main.html", {"things": Lazy(2)},
+        )
+        self.assertIn("main.html:2  {% for i in things %}", self.stdout())
+        counts = QueryCounts.read(data_file)
+        self.assertEqual(sum(row[2] for row in counts.rows()), 5)
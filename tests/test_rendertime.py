@@ -0,0 +1,86 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the per-line render time profiler."""
+
+import io
+import os.path
+
+from django_coverage_plugin.rendertime import (
+    RenderTimer,
+    RenderTimes,
+    render_time_report,
+)
+
+from .plugin_test import get_template
+from .test_probes import ProbeTestCase
+
+
+class FakeClock:
+    """A clock that ticks 10ns each time it's read."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 10
+        return self.now
+
+
+class RenderTimeTest(ProbeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="part.html", text="Part {{ i }}\n")
+        self.make_template(name="main.html", text="""\
+            Hello
+            {% for i in items %}
+                {% include "part.html" %}
+            {% endfor %}
+            """)
+
+    def test_inclusive_and_exclusive(self):
+        timer = RenderTimer()
+        timer.clock = FakeClock()
+        self.add_probe(timer)
+        get_template("main.html").render({"items": [1, 2]})
+
+        files = {os.path.basename(f): lines for f, lines in timer.times.files.items()}
+        # "Part " and {{ i }} each read the clock twice, for 10ns each.
+        self.assertEqual(files["part.html"], {1: [4, 40, 40]})
+        calls, inclusive, exclusive = files["main.html"][2]
+        self.assertEqual(calls, 1)
+        # The for loop's time includes everything rendered inside it.
+        self.assertGreater(inclusive, files["main.html"][3][1])
+        self.assertLess(exclusive, inclusive)
+        # Exclusive times add up to the time of the top-level nodes.
+        total_exclusive = sum(
+            stats[2] for lines in files.values() for stats in lines.values()
+        )
+        top_level = files["main.html"][1][1] + files["main.html"][2][1]
+        self.assertEqual(total_exclusive, top_level)
+
+    def test_report(self):
+        timer = RenderTimer()
+        self.add_probe(timer)
+        get_template("main.html").render({"items": list(range(20))})
+
+        out = io.StringIO()
+        render_time_report(timer.times, out, sort="calls", top=2)
+        report = out.getvalue().splitlines()
+        self.assertEqual(len(report), 3)
+        # Both lines render two nodes for each item.
+        self.assertEqual(
+            sorted(line.split("/")[-1] for line in report[1:]),
+            ['main.html:3  {% include "part.html" %}', "part.html:1  Part {{ i }}"],
+        )
+        self.assertTrue(all(line.split()[0] == "40" for line in report[1:]))
+
+    def test_render_times_option(self):
+        data_file = self.run_probe_option(
+            "render_times", RenderTimer, "render-times", "main.html", {"items": [1, 2, 3]},
+        )
+        self.assertIn("main.html:2  {% for i in items %}", self.stdout())
+        times = RenderTimes.read(data_file)
+        [part_lines] = [lines for f, lines in times.files.items() if f.endswith("part.html")]
+        self.assertEqual(part_lines[1][0], 6)
@@ -0,0 +1,140 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests that the plugin's work scales well with the size of templates."""
+
+import time
+import types
+
+from django.template import Context, Engine
+from django.template.base import Node
+
+from django_coverage_plugin.plugin import (
+    DjangoTemplatePlugin,
+    FileReporter,
+    load_django_template,
+)
+
+from .corpus import (
+    big_text,
+    extends_chain,
+    long_template,
+    many_includes,
+    nested_fors,
+    write_corpus,
+)
+from .plugin_test import DjangoPluginTestCase
+
+
+def best_time(func, repeat=5):
+    """The fastest of `repeat` calls of `func`, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def render_frame(node):
+    """Make something enough like a render frame for line_number_range."""
+    return types.SimpleNamespace(
+        f_code=types.SimpleNamespace(co_name="render"),
+        f_locals={"self": node},
+    )
+
+
+class ScalingTest(DjangoPluginTestCase):
+    """Check that work grows linearly (or better) with template size.
+
+    Timings are noisy, so the allowed growth is generous: a quadratic
+    algorithm would still be far outside it.
+
+    """
+
+    # The corpora are written directly, not with make_file.
+    no_files_in_temp_dir = True
+
+    # How much bigger the big templates are than the small ones.
+    FACTOR = 8
+    # How much worse than linear we'll tolerate.
+    SLACK = 2.5
+
+    def setUp(self):
+        super().setUp()
+        # We call line_number_range directly, without file_tracer having
+        # loaded Django's template classes first.
+        load_django_template()
+
+    def assert_linear(self, small_time, big_time, factor=FACTOR):
+        self.assertLess(
+            big_time, small_time * factor * self.SLACK,
+            f"{factor}x bigger took {big_time/small_time:.1f}x longer",
+        )
+
+    def template_nodes(self, root):
+        engine = Engine(dirs=[root], debug=True)
+        template = engine.get_template("main.html")
+        return template.nodelist.get_nodes_by_type(Node)
+
+    def test_get_line_map(self):
+        small = write_corpus(big_text(100_000), "small")
+        big = write_corpus(big_text(100_000 * self.FACTOR), "big")
+
+        def line_map(filename):
+            DjangoTemplatePlugin({}).get_line_map(filename)
+
+        self.assert_linear(best_time(lambda: line_map(small)), best_time(lambda: line_map(big)))
+
+    def test_file_reporter_lines(self):
+        small = write_corpus(long_template(1000), "small")
+        big = write_corpus(long_template(1000 * self.FACTOR), "big")
+
+        def lines(filename):
+            FileReporter(filename).lines()
+
+        self.assert_linear(best_time(lambda: lines(small)), best_time(lambda: lines(big)))
+
+    def test_line_number_range(self):
+        # The time for each node should stay about the same as templates grow.
+        plugin = DjangoTemplatePlugin({})
+        per_node = []
+        for size in [1000, 1000 * self.FACTOR]:
+            root = f"t{size}"
+            write_corpus(long_template(size), root)
+            frames = [render_frame(node) for node in self.template_nodes(root)]
+            # Fill the line map cache first.
+            plugin.line_number_range(frames[0])
+
+            def ranges():
+                for frame in frames:
+                    plugin.line_number_range(frame)
+
+            per_node.append(best_time(ranges) / len(frames))
+        self.assert_linear(per_node[0], per_node[1], factor=1)
+
+    def test_big_text_node(self):
+        # A multi-megabyte text node shouldn't cost more per render than a
+        # small one.
+        plugin = DjangoTemplatePlugin({})
+        times = []
+        for size in [10_000, 2_000_000]:
+            root = f"t{size}"
+            write_corpus(big_text(size), root)
+            frame = render_frame(self.template_nodes(root)[0])
+            self.assertEqual(plugin.line_number_range(frame)[0], 2)
+            times.append(best_time(lambda: plugin.line_number_range(frame), repeat=20))
+        self.assert_linear(times[0], times[1], factor=1)
+
+    def test_deep_structures(self):
+        # Large corpora of each shape can be analyzed and rendered.
+        for n, files in enumerate([
+            extends_chain(20),
+            many_includes(1000),
+            nested_fors(30),
+        ]):
+            root = f"corpus{n}"
+            main = write_corpus(files, root)
+            self.assertTrue(FileReporter(main).lines())
+            engine = Engine(dirs=[root], debug=True)
+            engine.get_template("main.html").render(Context({"name": "Ned", "items": [1]}))
@@ -3,8 +3,16 @@
 
 """Settings tests for django_coverage_plugin."""
 
+from unittest import mock
+
+from django.template import engines
 from django.test.utils import override_settings
 
+from django_coverage_plugin.plugin import (
+    DjangoTemplatePluginException,
+    check_debug,
+)
+
 from .plugin_test import DjangoPluginTestCase, get_test_settings
 
 # Make settings overrides for tests below.
@@ -41,3 +49,35 @@ class SettingsTest(DjangoPluginTestCase):
         self.make_template('Hello')
         with self.assert_plugin_disabled("Can't use non-Django templates."):
             self.run_django_coverage()
+
+
+class CheckDebugTest(DjangoPluginTestCase):
+    """Tests of remembering the result of check_debug."""
+
+    run_in_temp_dir = False
+
+    def test_check_is_remembered(self):
+        engines.all()
+        self.assertTrue(check_debug())
+        with mock.patch.object(engines, "all") as all_engines:
+            self.assertTrue(check_debug())
+        all_engines.assert_not_called()
+
+    def test_check_is_forgotten_when_templates_change(self):
+        engines.all()
+        self.assertTrue(check_debug())
+        with override_settings(**DEBUG_FALSE_OVERRIDES):
+            engines.all()
+            msg = "Template debugging must be enabled in settings."
+            with self.assertRaisesRegex(DjangoTemplatePluginException, msg):
+                check_debug()
+        engines.all()
+        self.assertTrue(check_debug())
+
+    def test_other_settings_dont_matter(self):
+        engines.all()
+        self.assertTrue(check_debug())
+        with override_settings(USE_TZ=True):
+            with mock.patch.object(engines, "all") as all_engines:
+                self.assertTrue(check_debug())
+        all_engines.assert_not_called()
@@ -4,6 +4,7 @@
 """Tests of template inheritance for django_coverage_plugin."""
 
 import os
+from unittest import mock
 
 try:
     from coverage.exceptions import NoSource
@@ -177,3 +178,64 @@ class FindSourceTest(DjangoPluginTestCase):
         # Run coverage again with an HTML report on disk.
         text = self.run_django_coverage(name="main.html")
         self.assert_measured_files("main.html")
+
+
+class TemplateIncludeOmitTest(DjangoPluginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_template(name="main.html", text="""\
+            Hello
+            {% include "vendor/part.html" %}
+            """)
+        self.make_template(name="vendor/part.html", text="Part\n")
+        self.make_template(name="vendor/unused.html", text="Not used\n")
+        self.make_template(name="unused.html", text="Not used\n")
+
+    def configure(self, **options):
+        self.make_file(".coveragerc", "[run]\nplugins = django_coverage_plugin\n" + (
+            "[django_coverage_plugin]\n" +
+            "".join(f"{name} = {value}\n" for name, value in options.items())
+        ))
+
+    def test_omit(self):
+        self.configure(template_omit="*/vendor/*")
+        text = self.run_django_coverage(name="main.html")
+        self.assertEqual(text, "Hello\nPart\n\n")
+        self.assert_analysis([1, 2], name="main.html")
+        self.assert_measured_files("main.html", "unused.html")
+
+        # Each template is checked once.
+        choices = {
+            os.path.relpath(filename): measured
+            for filename, measured in self.django_plugins()[0].template_choices.items()
+        }
+        self.assertEqual(choices, {
+            os.path.join("templates", "main.html"): True,
+            os.path.join("templates", "vendor", "part.html"): False,
+        })
+
+    def test_include(self):
+        self.configure(template_include="templates/vendor/*\n    */main.html")
+        self.run_django_coverage(name="main.html")
+        self.assert_analysis([1, 2], name="main.html")
+        self.assert_analysis([1], name="vendor/part.html")
+        self.assert_measured_files("main.html", "vendor/part.html", "vendor/unused.html")
+
+    def test_include_and_omit(self):
+        self.configure(template_include="*/vendor/*", template_omit="*/unused.html")
+        self.run_django_coverage(name="main.html")
+        self.assert_measured_files("vendor/part.html")
+
+    def test_omit_with_probes(self):
+        self.configure(template_omit="*/vendor/*", hit_counts="hits.json")
+        with mock.patch("django_coverage_plugin.plugin.atexit.register"):
+            self.run_django_coverage(name="main.html")
+        hooks = self.django_plugins()[0].render_hooks
+        self.addCleanup(hooks.uninstall)
+        # Omitted templates aren't mapped to lines, so they aren't counted.
+        [counter] = hooks.probes
+        self.assertEqual(
+            [os.path.relpath(filename) for filename in counter.counts.files],
+            [os.path.join("templates", "main.html")],
+        )
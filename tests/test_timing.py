@@ -0,0 +1,145 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the callback timing histograms."""
+
+import glob
+import json
+import os.path
+from unittest import mock
+
+from django_coverage_plugin.__main__ import main
+from django_coverage_plugin.plugin import DjangoTemplatePluginException
+from django_coverage_plugin.timing import NUM_BUCKETS, Histogram, Timings
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class HistogramTest(DjangoPluginTestCase):
+
+    no_files_in_temp_dir = True
+
+    def test_buckets(self):
+        hist = Histogram()
+        for ns in [0, 1, 3, 1000, 1023, 1024, 2**40]:
+            hist.record(ns)
+        self.assertEqual(hist.count(), 7)
+        self.assertEqual(hist.counts[0], 1)
+        self.assertEqual(hist.counts[1], 1)
+        self.assertEqual(hist.counts[2], 1)
+        self.assertEqual(hist.counts[10], 2)
+        self.assertEqual(hist.counts[11], 1)
+        self.assertEqual(hist.counts[NUM_BUCKETS-1], 1)
+        self.assertEqual(hist.total_ns, 0 + 1 + 3 + 1000 + 1023 + 1024 + 2**40)
+
+    def test_percentile(self):
+        hist = Histogram()
+        for _ in range(99):
+            hist.record(100)
+        hist.record(100000)
+        self.assertEqual(hist.percentile(50), 128)
+        self.assertEqual(hist.percentile(99), 128)
+        self.assertEqual(hist.percentile(100), 2**17)
+        self.assertEqual(Histogram().percentile(50), 0)
+
+    def test_timed(self):
+        timings = Timings()
+        double = timings.timed("double", lambda x: x * 2)
+        self.assertEqual(double(3), 6)
+        self.assertEqual(double(4), 8)
+        self.assertEqual(timings.histograms["double"].count(), 2)
+
+
+class TimingsTest(DjangoPluginTestCase):
+
+    def test_timings_option(self):
+        self.make_template("Hello {{ name }}\n")
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            timings = plugin_timings.json
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(context={"name": "Ned"})
+            self.get_analysis()
+        # At exit, the timings are saved.  The .coveragerc and
+        # run_django_coverage both name the plugin, so there are two: one
+        # traces and the other reports.  Save them as if they were in
+        # different processes.
+        saves = [
+            call.args for call in register.call_args_list
+            if isinstance(getattr(call.args[0], "__self__", None), Timings)
+        ]
+        for i, (save, filename) in enumerate(saves):
+            save.__self__.write(f"{filename}.host.{i}")
+        self.assertEqual(len(glob.glob("plugin_timings.json.*")), 2)
+
+        self.assertEqual(main(["timings", "plugin_timings.json"]), 0)
+        self.assertEqual(glob.glob("plugin_timings.json.*"), [])
+        timings = Timings.read("plugin_timings.json")
+        for name in ["dynamic_source_filename", "line_number_range", "get_line_map"]:
+            self.assertGreater(timings.histograms[name].count(), 0)
+        self.assertEqual(timings.histograms["FileReporter.lines"].count(), 1)
+        self.assertIn("line_number_range", self.stdout())
+        [template] = timings.templates
+        self.assertTrue(template.endswith("test_timings_option.html"))
+
+    def test_template_report(self):
+        self.make_template(name="small.html", text="Hello {{ name }}\n")
+        self.make_template(name="loop.html", text="""\
+            {% for i in items %}
+                {{ i }}{% if i %}yes{% endif %}
+            {% endfor %}
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            timings = plugin_timings.json
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(name="small.html", context={"name": "Ned"})
+            self.run_django_coverage(name="loop.html", context={"items": list(range(50))})
+        saves = [
+            call.args for call in register.call_args_list
+            if isinstance(getattr(call.args[0], "__self__", None), Timings)
+        ]
+        for i, (save, filename) in enumerate(saves):
+            save.__self__.write(f"{filename}.host.{i}")
+
+        ret = main(["timings", "plugin_timings.json", "--sort", "calls", "--json", "top.json"])
+        self.assertEqual(ret, 0)
+        with open("top.json") as f:
+            top = json.load(f)
+        self.assertEqual(
+            [os.path.basename(row["template"]) for row in top],
+            ["loop.html", "small.html"],
+        )
+        self.assertGreater(top[0]["calls"], top[1]["calls"])
+        report = self.stdout()
+        self.assertLess(report.index("loop.html"), report.index("small.html"))
+
+    def test_combining(self):
+        one = Timings()
+        one.timed("f", lambda: None)()
+        one.write("t.json.host.1")
+        two = Timings()
+        two.timed("f", lambda: None)()
+        two.timed("g", lambda: None)()
+        two.timed("h", lambda: "a.html", template_of=lambda args, result: result)()
+        two.write("t.json.host.2")
+
+        combined = main(["timings", "t.json", "--keep"])
+        self.assertEqual(combined, 0)
+        timings = Timings.read("t.json")
+        self.assertEqual(timings.histograms["f"].count(), 2)
+        self.assertEqual(timings.histograms["g"].count(), 1)
+        self.assertEqual(timings.templates["a.html"][0], 1)
+        self.assertEqual(len(glob.glob("t.json.*")), 2)
+
+    def test_bad_version(self):
+        self.make_file("t.json", '{"version": 99, "histograms": {}}')
+        msg = "Timings t.json have an unsupported version: 99"
+        with self.assertRaisesRegex(DjangoTemplatePluginException, msg):
+            Timings.read("t.json")
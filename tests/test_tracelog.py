@@ -0,0 +1,121 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of the trace log."""
+
+import os.path
+from unittest import mock
+
+from django_coverage_plugin.__main__ import main
+from django_coverage_plugin.plugin import (
+    DjangoTemplatePlugin,
+    DjangoTemplatePluginException,
+)
+from django_coverage_plugin.tracelog import (
+    TraceLog,
+    read_trace_log,
+    trace_log_files,
+)
+
+from .plugin_test import DjangoPluginTestCase
+
+
+class TraceLogTest(DjangoPluginTestCase):
+
+    def test_round_trip(self):
+        log = TraceLog(10)
+        log.record(int, "a.html", 1, 2)
+        log.record(str, "b.html", 3, 3)
+        log.record(int, "b.html", -1, -1)
+        log.write("trace.log")
+
+        header, records = read_trace_log("trace.log")
+        self.assertEqual(header["total"], 3)
+        self.assertEqual(records, [
+            ("int", "a.html", 1, 2),
+            ("str", "b.html", 3, 3),
+            ("int", "b.html", -1, -1),
+        ])
+
+    def test_ring_buffer(self):
+        log = TraceLog(4)
+        for n in range(10):
+            log.record(int, "a.html", n, n)
+        log.write("trace.log")
+
+        header, records = read_trace_log("trace.log")
+        self.assertEqual(header["total"], 10)
+        self.assertEqual([start for _, _, start, _ in records], [6, 7, 8, 9])
+
+    def test_not_a_trace_log(self):
+        self.make_file("trace.log", "Hello")
+        with self.assertRaisesRegex(DjangoTemplatePluginException, "trace.log isn't a trace log"):
+            read_trace_log("trace.log")
+
+    def test_empty_log_isnt_saved(self):
+        TraceLog(10).save("trace.log")
+        self.assertEqual(os.listdir("."), [])
+
+    def test_saved_per_process(self):
+        for pid, start in [(123, 1), (456, 2)]:
+            log = TraceLog(10)
+            log.record(int, "a.html", start, start)
+            with mock.patch("os.getpid", return_value=pid):
+                log.save("trace.log")
+        parts = trace_log_files("trace.log")
+        self.assertEqual(len(parts), 2)
+        self.assertNotIn("trace.log", parts)
+
+        self.assertEqual(main(["tracelog", "trace.log"]), 0)
+        out = self.stdout()
+        self.assertIn("a.html:1-1 int", out)
+        self.assertIn("a.html:2-2 int", out)
+        self.assertEqual(out.count("1 events, the last 1 kept"), 2)
+
+    def test_no_trace_logs(self):
+        with self.assertRaisesRegex(DjangoTemplatePluginException, "No trace logs for trace.log"):
+            trace_log_files("trace.log")
+
+    def test_bad_trace_log_size(self):
+        for size in ["0", "-5", "lots"]:
+            msg = f"trace_log_size must be a positive integer, not '{size}'"
+            with self.assertRaisesRegex(DjangoTemplatePluginException, msg):
+                DjangoTemplatePlugin({"trace_log": "plugin_trace.log", "trace_log_size": size})
+
+    def test_trace_log_option(self):
+        self.make_template("""\
+            Hello {{ name }}
+            {% for i in items %}{{ i }}{% endfor %}
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            trace_log = plugin_trace.log
+            trace_log_size = 1000
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(context={"name": "Ned", "items": [1, 2, 3]})
+        # At exit, the process's log is written.  The .coveragerc and run_django_coverage
+        # both name the plugin: the first one traces.
+        save, filename = next(
+            call.args for call in register.call_args_list
+            if isinstance(getattr(call.args[0], "__self__", None), TraceLog)
+        )
+        save(filename)
+
+        [part] = trace_log_files("plugin_trace.log")
+        header, records = read_trace_log(part)
+        self.assertEqual(header["capacity"], 1000)
+        events = {
+            (node_type, os.path.basename(filename), start, end)
+            for node_type, filename, start, end in records
+        }
+        self.assertIn(("VariableNode", "test_trace_log_option.html", 1, 1), events)
+        self.assertIn(("ForNode", "test_trace_log_option.html", 2, 2), events)
+        self.assertIn(("Template", "test_trace_log_option.html", -1, -1), events)
+
+        self.assertEqual(main(["tracelog", "plugin_trace.log"]), 0)
+        self.assertIn("test_trace_log_option.html:2-2 ForNode", self.stdout())
+        self.assertEqual(main(["tracelog", "plugin_trace.log", "--summary"]), 0)
+        self.assertRegex(self.stdout(), r"Template +\d+ +\d+")
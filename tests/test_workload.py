@@ -0,0 +1,119 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/django_coverage_plugin/blob/master/NOTICE.txt
+
+"""Tests of recording and replaying template workloads."""
+
+from unittest import mock
+
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from django_coverage_plugin.plugin import DjangoTemplatePluginException
+from django_coverage_plugin.workload import (
+    Workload,
+    WorkloadRecorder,
+    unpickle_snapshot,
+)
+
+from .plugin_test import Context, DjangoPluginTestCase, Template, get_template
+
+
+class WorkloadTest(DjangoPluginTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Renders are only announced in a test environment.
+        setup_test_environment()
+        self.addCleanup(teardown_test_environment)
+
+        self.make_template(name="part.html", text="Part {{ n }}\n")
+        self.make_template(name="main.html", text="""\
+            Hello {{ name }}
+            {% include "part.html" %}
+            """)
+
+    def test_recording(self):
+        with WorkloadRecorder() as recorder:
+            get_template("main.html").render({"name": "Ned", "n": 1, "func": lambda: 1})
+            get_template("part.html").render({"n": 2})
+            Template("Not recorded").render(Context())
+
+        # Only the top-level renders are recorded, not the include, and not
+        # the string template.
+        renders = [(name, unpickle_snapshot(ctx)["n"]) for _, name, ctx in recorder.renders]
+        self.assertEqual(renders, [("main.html", 1), ("part.html", 2)])
+        # Things that can't be pickled aren't in the snapshot.
+        self.assertNotIn("func", recorder.renders[0][2])
+        self.assertEqual(len(recorder.engines), 1)
+        self.assertEqual(len(recorder.engines[0]["dirs"]), 1)
+
+    def test_snapshot_is_taken_at_render_time(self):
+        names = ["Ned"]
+        with WorkloadRecorder() as recorder:
+            get_template("main.html").render({"name": names, "n": 1})
+        names.append("Ben")
+        self.assertEqual(unpickle_snapshot(recorder.renders[0][2])["name"], ["Ned"])
+
+    def test_replay(self):
+        with WorkloadRecorder() as recorder:
+            get_template("main.html").render({"name": "Ned", "n": 1})
+            get_template("main.html").render({"name": "Ben", "n": 2})
+        with mock.patch("socket.gethostname", return_value="host"):
+            recorder.save("workload.pkl")
+
+        workload = Workload.load("workload.pkl")
+        self.assertEqual(len(workload.templates()), 2)
+        with mock.patch("django.test.signals.template_rendered.send") as rendered:
+            workload.replay()
+        self.assertEqual(rendered.call_count, 4)
+        contexts = [call.kwargs["context"] for call in rendered.call_args_list]
+        self.assertEqual([c["name"] for c in contexts], ["Ned", "Ned", "Ben", "Ben"])
+
+    def test_processes_are_merged(self):
+        # Each process saves its own file, and loading reads them all.
+        with mock.patch("socket.gethostname", side_effect=["one", "two", "three"]):
+            with WorkloadRecorder() as recorder:
+                get_template("main.html").render({"name": "Ned", "n": 1})
+            recorder.save("workload.pkl")
+            with WorkloadRecorder() as recorder:
+                get_template("part.html").render({"n": 2})
+            recorder.save("workload.pkl")
+            # Nothing was rendered, so nothing is written.
+            WorkloadRecorder().save("workload.pkl")
+
+        workload = Workload.load("workload.pkl")
+        self.assertEqual(
+            sorted(name for _, name, _ in workload.renders), ["main.html", "part.html"],
+        )
+        # Both processes had the same engine.
+        self.assertEqual(len(workload.engine_configs), 1)
+        self.assertEqual(len(workload.templates()), 2)
+
+    def test_no_workload(self):
+        with self.assertRaisesRegex(DjangoTemplatePluginException, "No workload files"):
+            Workload.load("workload.pkl")
+
+    def test_record_workload_option(self):
+        self.make_file(".coveragerc", """\
+            [run]
+            plugins = django_coverage_plugin
+            [django_coverage_plugin]
+            record_workload = workload.pkl
+            """)
+        with mock.patch("django_coverage_plugin.plugin.atexit.register") as register:
+            self.run_django_coverage(name="main.html", context={"name": "Ned", "n": 1})
+        # At exit, the recorders save the workload.  The .coveragerc and
+        # run_django_coverage both name the plugin, so there are two, but only
+        # the first one traces, and so starts recording.
+        saves = [
+            call.args for call in register.call_args_list
+            if isinstance(getattr(call.args[0], "__self__", None), WorkloadRecorder)
+        ]
+        self.assertEqual(len(saves), 2)
+        self.assertEqual([save.__self__.started for save, _ in saves], [True, False])
+        with mock.patch("socket.gethostname", side_effect=["one", "two"]):
+            for save, filename in saves:
+                save.__self__.stop()
+                save(filename)
+
+        workload = Workload.load("workload.pkl")
+        self.assertEqual([name for _, name, _ in workload.renders], ["main.html"])